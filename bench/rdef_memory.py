@@ -0,0 +1,66 @@
+# copyright 2016 LOGILAB S.A. (Paris, FRANCE), all rights reserved.
+# contact http://www.logilab.fr/ -- mailto:contact@logilab.fr
+#
+# This file is part of yams.
+#
+# yams is free software: you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# yams is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with yams. If not, see <http://www.gnu.org/licenses/>.
+"""Memory used by relation definitions of a large schema.
+
+Compare the size of relation definition objects with the size they would have
+if their attributes were stored in an instance dictionary.
+
+usage: python bench/rdef_memory.py [number of entity types]
+"""
+from __future__ import print_function
+
+import sys
+
+from synthetic import build_schema
+
+
+class _DictHolder(object):
+    """object storing attributes in a dictionary, as relation definitions
+    used to do
+    """
+
+
+def rdefs_size(rdefs):
+    slots = dicts = 0
+    for rdef in rdefs:
+        slots += sys.getsizeof(rdef)
+        if rdef._extra:
+            slots += sys.getsizeof(rdef._extra)
+        holder = _DictHolder()
+        holder.__dict__.update(rdef.__getstate__())
+        dicts += sys.getsizeof(holder) + sys.getsizeof(holder.__dict__)
+    return slots, dicts
+
+
+def main(nbetypes=300):
+    # plain attributes and relations only
+    schema = build_schema(nbetypes=nbetypes, wildcards=0, constraints=0)
+    rdefs = set(rdef for rschema in schema.relations()
+                for rdef in rschema.rdefs.values())
+    infered = sum(1 for rdef in rdefs if rdef.infered)
+    slots, dicts = rdefs_size(rdefs)
+    print('%s relation definitions (%s infered)' % (len(rdefs), infered))
+    print('slots: %.1f KiB (%s bytes per relation definition)'
+          % (slots / 1024., slots // len(rdefs)))
+    print('dict:  %.1f KiB (%s bytes per relation definition)'
+          % (dicts / 1024., dicts // len(rdefs)))
+    print('reduction: %.0f%%' % (100. * (dicts - slots) / dicts))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
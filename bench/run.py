@@ -0,0 +1,272 @@
+# copyright 2016 LOGILAB S.A. (Paris, FRANCE), all rights reserved.
+# contact http://www.logilab.fr/ -- mailto:contact@logilab.fr
+#
+# This file is part of yams.
+#
+# yams is free software: you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# yams is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with yams. If not, see <http://www.gnu.org/licenses/>.
+"""Benchmarks of yams on a synthetic schema (see `synthetic.py`).
+
+Each benchmark is run several times and the best time is kept, then once more
+to measure peak memory allocated by python (python >= 3.4 only). Results are
+printed as a table, and optionally written as JSON for regression tracking.
+
+usage: python bench/run.py [options] [benchmark...]
+"""
+from __future__ import print_function
+
+import json
+import os.path as osp
+import platform
+import shutil
+import sys
+import tempfile
+from optparse import OptionParser
+from timeit import default_timer
+
+try:
+    import tracemalloc
+except ImportError: # python < 3.4
+    tracemalloc = None
+
+from six.moves import cPickle as pickle
+
+from yams import __version__
+from yams.profiling import BuildProfile
+from yams.reader import fill_schema
+from yams.schema import Schema
+from yams.schema2dot import schema2dot
+from yams.serialize import serialize_to_python
+
+import synthetic
+
+# phases of the schema building process reported along the fill_schema
+# benchmark
+BUILD_PHASES = ('expand_relation_definitions', 'finalize')
+
+BENCHMARKS = []
+
+
+def benchmark(func):
+    """register a benchmark function.
+
+    It's given the benchmark parameters and return a 2-uple (number of
+    operations, callable doing them), so that setup isn't accounted. The
+    callable may return a `BuildProfile` whose phases in `BUILD_PHASES` are
+    reported too.
+    """
+    BENCHMARKS.append(func)
+    return func
+
+
+def _erdefs(params):
+    erdefs = {}
+    for definition in synthetic.schema_namespace(**params).values():
+        definition.expand_type_definitions(erdefs)
+    return erdefs
+
+
+def _schema(params):
+    # build once per parameters set
+    key = tuple(sorted(params.items()))
+    if key not in _SCHEMAS:
+        _SCHEMAS[key] = synthetic.build_schema(**params)
+    return _SCHEMAS[key]
+_SCHEMAS = {}
+
+
+@benchmark
+def fill_schema_(params):
+    erdefs = _erdefs(params)
+    def run():
+        profile = BuildProfile()
+        fill_schema(Schema('bench'), erdefs, profile=profile)
+        return profile
+    return len(erdefs), run
+
+
+@benchmark
+def check(params, nbentities=10):
+    entities = [(eschema, synthetic.sample_entity(eschema))
+                for eschema in _schema(params).entities()
+                if not eschema.final
+                for i in range(nbentities)]
+    def run():
+        for eschema, entity in entities:
+            eschema.check(entity)
+    return len(entities), run
+
+
+@benchmark
+def rdef(params):
+    lookups = [(eschema, rschema, role)
+               for eschema in _schema(params).entities()
+               for role, rschemas in (('subject', eschema.subject_relations()),
+                                      ('object', eschema.object_relations()))
+               for rschema in rschemas]
+    def run():
+        for eschema, rschema, role in lookups:
+            eschema.rdef(rschema, role, takefirst=True)
+    return len(lookups), run
+
+
+@benchmark
+def pickle_(params):
+    schema = _schema(params)
+    def run():
+        pickle.dumps(schema, pickle.HIGHEST_PROTOCOL)
+    return 1, run
+
+
+@benchmark
+def unpickle(params):
+    data = pickle.dumps(_schema(params), pickle.HIGHEST_PROTOCOL)
+    def run():
+        pickle.loads(data)
+    return 1, run
+
+
+@benchmark
+def serialize_to_python_(params):
+    schema = _schema(params)
+    def run():
+        serialize_to_python(schema)
+    return 1, run
+
+
+@benchmark
+def schema2dot_(params):
+    schema = _schema(params)
+    def run():
+        tmpdir = tempfile.mkdtemp()
+        try:
+            schema2dot(schema, osp.join(tmpdir, 'schema.dot'))
+        finally:
+            shutil.rmtree(tmpdir)
+    return 1, run
+
+
+def bench_name(func):
+    return func.__name__.rstrip('_')
+
+
+def _time(func, params):
+    ops, run = func(params)
+    start = default_timer()
+    profile = run()
+    return ops, default_timer() - start, profile
+
+
+def _peak_memory(func, params):
+    if tracemalloc is None:
+        return None
+    ops, run = func(params)
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmark(func, params, repeat=3, memory=True):
+    """run benchmark `func` `repeat` times and return a list of results
+    dictionaries
+    """
+    best = None
+    for i in range(repeat):
+        ops, duration, profile = _time(func, params)
+        if best is None or duration < best[1]:
+            best = (ops, duration, profile)
+    ops, duration, profile = best
+    name = bench_name(func)
+    results = [{'name': name, 'ops': ops, 'time': duration,
+                'throughput': ops / duration if duration else None,
+                'peak_memory': _peak_memory(func, params) if memory else None}]
+    if isinstance(profile, BuildProfile):
+        for phase in BUILD_PHASES:
+            if phase in profile:
+                stats = profile[phase]
+                results.append({'name': '%s:%s' % (name, phase),
+                                'ops': stats.calls, 'time': stats.time,
+                                'throughput': (stats.calls / stats.time
+                                               if stats.time else None),
+                                'peak_memory': None})
+    return results
+
+
+def format_results(results):
+    lines = ['%-40s %8s %10s %12s %12s' % ('benchmark', 'ops', 'time (s)',
+                                            'ops/s', 'peak (KiB)')]
+    for result in results:
+        lines.append('%-40s %8d %10.4f %12s %12s' % (
+            result['name'], result['ops'], result['time'],
+            '%.1f' % result['throughput'] if result['throughput'] else '-',
+            '%.1f' % (result['peak_memory'] / 1024.)
+            if result['peak_memory'] is not None else '-'))
+    return '\n'.join(lines)
+
+
+def run(args):
+    parser = OptionParser(usage='%prog [options] [benchmark...]\n\n'
+                          'available benchmarks: '
+                          + ', '.join(bench_name(func) for func in BENCHMARKS))
+    parser.add_option('-e', '--etypes', type='int', default=100,
+                      help='number of entity types')
+    parser.add_option('-a', '--attributes', type='int', default=10,
+                      help='number of attributes per entity type')
+    parser.add_option('-r', '--relations', type='int', default=5,
+                      help='number of relations per entity type')
+    parser.add_option('-d', '--depth', type='int', default=3,
+                      help='depth of entity types inheritance trees')
+    parser.add_option('-w', '--wildcards', type='int', default=2,
+                      help='number of relation types defined using wildcards')
+    parser.add_option('-c', '--constraints', type='float', default=0.5,
+                      help='ratio of attributes having constraints')
+    parser.add_option('-n', '--repeat', type='int', default=3,
+                      help='number of runs of each benchmark, best is kept')
+    parser.add_option('--no-memory', action='store_false', dest='memory',
+                      default=True, help="don't measure peak memory")
+    parser.add_option('-j', '--json', metavar='FILE',
+                      help="write results as JSON into FILE ('-' for stdout)")
+    options, names = parser.parse_args(args)
+    benchmarks = BENCHMARKS
+    if names:
+        byname = dict((bench_name(func), func) for func in BENCHMARKS)
+        unknown = [name for name in names if name not in byname]
+        if unknown:
+            parser.error('unknown benchmark(s): %s' % ', '.join(unknown))
+        benchmarks = [byname[name] for name in names]
+    params = {'nbetypes': options.etypes, 'nbattrs': options.attributes,
+              'nbrels': options.relations, 'depth': options.depth,
+              'wildcards': options.wildcards,
+              'constraints': options.constraints}
+    results = []
+    for func in benchmarks:
+        results += run_benchmark(func, params, options.repeat, options.memory)
+    if options.json != '-':
+        print(format_results(results))
+    if options.json:
+        data = {'yams': __version__,
+                'python': platform.python_version(),
+                'params': params, 'repeat': options.repeat,
+                'results': results}
+        if options.json == '-':
+            json.dump(data, sys.stdout, indent=2, sort_keys=True)
+        else:
+            with open(options.json, 'w') as stream:
+                json.dump(data, stream, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    run(sys.argv[1:])
@@ -0,0 +1,110 @@
+# copyright 2016 LOGILAB S.A. (Paris, FRANCE), all rights reserved.
+# contact http://www.logilab.fr/ -- mailto:contact@logilab.fr
+#
+# This file is part of yams.
+#
+# yams is free software: you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# yams is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with yams. If not, see <http://www.gnu.org/licenses/>.
+"""Synthetic schemas of parameterized size, for benchmarks.
+
+Generated schemas are deterministic: the same parameters always give the same
+schema.
+"""
+
+from datetime import date
+
+from yams.buildobjs import (EntityType, RelationDefinition, SubjectRelation,
+                            String, Int, Date)
+from yams.interfaces import IVocabularyConstraint
+from yams.constraints import IntervalBoundConstraint
+from yams.reader import build_schema_from_namespace
+
+# attribute types, used in turn by entity types
+ATTRIBUTE_TYPES = ('String', 'Int', 'Date', 'Vocabulary')
+
+
+def _attribute(attrtype, constrained):
+    if attrtype == 'String':
+        return String(maxsize=64) if constrained else String()
+    if attrtype == 'Int':
+        if constrained:
+            return Int(constraints=[IntervalBoundConstraint(0, 1000)])
+        return Int()
+    if attrtype == 'Date':
+        return Date()
+    if constrained:
+        return String(vocabulary=(u'draft', u'published', u'archived'))
+    return String()
+
+
+def schema_namespace(nbetypes=100, nbattrs=10, nbrels=5, depth=3, wildcards=2,
+                     constraints=0.5):
+    """return a dictionary of schema definitions with:
+
+    * `nbetypes` entity types, organized in inheritance trees of depth
+      `depth` (use 1 for no inheritance) so that relation definitions are
+      infered
+
+    * `nbattrs` attributes per entity type, of various types, a ratio of
+      `constraints` of them (between 0 and 1) having constraints
+
+    * `nbrels` relations from each entity type to other entity types
+
+    * `wildcards` relation types defined between all entity types, or from all
+      entity types to a single one
+    """
+    namespace = {}
+    nbconstrained = int(nbattrs * constraints)
+    for i in range(nbetypes):
+        attrs = dict(('attr%s_%s' % (i, j),
+                      _attribute(ATTRIBUTE_TYPES[j % len(ATTRIBUTE_TYPES)],
+                                 j < nbconstrained))
+                     for j in range(nbattrs))
+        attrs.update(('rel%s_%s' % (i, j),
+                      SubjectRelation('Type%s' % ((i + j) % nbetypes)))
+                     for j in range(nbrels))
+        if depth > 1 and i % depth:
+            attrs['__specializes_schema__'] = True
+            bases = (namespace['Type%s' % (i - 1)],)
+        else:
+            bases = (EntityType,)
+        namespace['Type%s' % i] = type('Type%s' % i, bases, attrs)
+    for i in range(wildcards):
+        name = 'wildcard%s' % i
+        namespace[name] = type(name, (RelationDefinition,),
+                               {'subject': '*',
+                                'object': 'Type0' if i % 2 else '*'})
+    return namespace
+
+
+def build_schema(**kwargs):
+    """return a schema built from `schema_namespace(**kwargs)`"""
+    return build_schema_from_namespace(schema_namespace(**kwargs).items())
+
+
+# valid value of attributes by type
+_VALUES = {'String': u'some text', 'Int': 42, 'Date': date(2016, 1, 1)}
+
+
+def sample_entity(eschema):
+    """return a dictionary giving a valid value to each attribute of
+    `eschema`, as generated by `schema_namespace`
+    """
+    entity = {}
+    for rschema, aschema in eschema.attribute_definitions():
+        cstr = eschema.rdef(rschema).constraint_by_interface(IVocabularyConstraint)
+        if cstr is not None:
+            entity[rschema.type] = cstr.vocabulary()[0]
+        else:
+            entity[rschema.type] = _VALUES[aschema.type]
+    return entity
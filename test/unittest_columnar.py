@@ -0,0 +1,137 @@
+# copyright 2016 LOGILAB S.A. (Paris, FRANCE), all rights reserved.
+# contact http://www.logilab.fr/ -- mailto:contact@logilab.fr
+#
+# This file is part of yams.
+#
+# yams is free software: you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# yams is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with yams. If not, see <http://www.gnu.org/licenses/>.
+"""unit tests for module yams.columnar"""
+
+from logilab.common.testlib import TestCase, unittest_main
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from yams.reader import build_schema_from_namespace
+from yams.buildobjs import EntityType, String, Int, Float, Date
+from yams.constraints import (BoundaryConstraint, IntervalBoundConstraint,
+                              Attribute)
+
+
+def build_schema():
+
+    class Person(EntityType):
+        name = String(required=True, maxsize=10)
+        sex = String(vocabulary=(u'M', u'F'))
+        age = Int(constraints=[IntervalBoundConstraint(0, 150)])
+        height = Float(constraints=[BoundaryConstraint('>', 0)])
+        min_age = Int()
+        max_age = Int(constraints=[BoundaryConstraint('>=', Attribute('min_age'))])
+        birth = Date()
+
+    return build_schema_from_namespace(locals().items())
+
+
+class ColumnarCheckTC(TestCase):
+
+    def setUp(self):
+        if numpy is None:
+            self.skipTest('numpy is not available')
+        from yams import columnar
+        self.columnar = columnar
+        self.eschema = build_schema().eschema('Person')
+
+    def test_valid(self):
+        mask, codes = self.eschema.check_columns(
+            {'name': numpy.array([u'bob', u'alice']),
+             'sex': [u'M', None],
+             'age': numpy.array([12, 150]),
+             'height': numpy.array([1.2, 1.8]),
+             'birth': ['2000-01-01', None]},
+            creation=True)
+        self.assertEqual(mask.tolist(), [True, True])
+        self.assertEqual(sorted(codes),
+                         ['age-subject', 'birth-subject', 'height-subject',
+                          'name-subject', 'sex-subject'])
+
+    def test_errors(self):
+        columnar = self.columnar
+        mask, codes = self.eschema.check_columns(
+            {'name': [u'bob', None, 1, u'x' * 11],
+             'sex': numpy.array([u'M', u'X', u'F', u'F']),
+             'age': numpy.array([-1, 12, 151, 12]),
+             'height': [1.2, u'big', 0, 2.]})
+        self.assertEqual(mask.tolist(), [False, False, False, False])
+        self.assertEqual(codes['name-subject'].tolist(),
+                         [columnar.VALID, columnar.REQUIRED,
+                          columnar.BAD_TYPE, columnar.CONSTRAINT])
+        self.assertEqual(codes['sex-subject'].tolist(),
+                         [columnar.VALID, columnar.CONSTRAINT, columnar.VALID,
+                          columnar.VALID])
+        self.assertEqual(codes['age-subject'].tolist(),
+                         [columnar.CONSTRAINT, columnar.VALID,
+                          columnar.CONSTRAINT, columnar.VALID])
+        self.assertEqual(codes['height-subject'].tolist(),
+                         [columnar.VALID, columnar.BAD_TYPE,
+                          columnar.CONSTRAINT, columnar.VALID])
+
+    def test_missing_required(self):
+        mask, codes = self.eschema.check_columns({'age': [1, 2]}, creation=True)
+        self.assertEqual(mask.tolist(), [False, False])
+        self.assertEqual(codes['name-subject'].tolist(),
+                         [self.columnar.REQUIRED] * 2)
+        mask, codes = self.eschema.check_columns({'age': [1, 2]})
+        self.assertEqual(mask.tolist(), [True, True])
+
+    def test_per_row_fallback(self):
+        mask, codes = self.eschema.check_columns(
+            {'min_age': numpy.array([10, 10, 10]),
+             'max_age': numpy.array([20, 5, None], dtype=object)})
+        self.assertEqual(mask.tolist(), [True, False, True])
+        self.assertEqual(codes['max_age-subject'].tolist(),
+                         [self.columnar.VALID, self.columnar.CONSTRAINT,
+                          self.columnar.VALID])
+
+    def test_same_result_as_check(self):
+        rows = [{'name': u'bob', 'age': 12}, {'name': u'bobbybobbybob'},
+                {'name': u'bob', 'age': 200}, {'name': u'bob', 'sex': u'M'}]
+        entities = [dict(row) for row in rows]
+        invalid = set(id(ex.entity) for ex in self.eschema.check_many(entities))
+        expected = [id(entity) not in invalid for entity in entities]
+        for attr in ('age', 'sex'):
+            for row in rows:
+                row.setdefault(attr, None)
+        columns = dict((attr, [row[attr] for row in rows])
+                       for attr in ('name', 'age', 'sex'))
+        mask, codes = self.eschema.check_columns(columns)
+        self.assertEqual(mask.tolist(), expected)
+        self.assertEqual(expected, [True, False, False, True])
+
+    def test_converted_values(self):
+        # strings are valid integers, converted before checking constraints
+        mask, codes = self.eschema.check_columns(
+            {'name': [u'bob', u'bob'], 'age': numpy.array([u'12', u'200'])})
+        self.assertEqual(mask.tolist(), [True, False])
+        self.assertEqual(codes['age-subject'].tolist(),
+                         [self.columnar.VALID, self.columnar.CONSTRAINT])
+        self.eschema.check({'name': u'bob', 'age': u'12'})
+
+    def test_bad_columns_length(self):
+        with self.assertRaises(ValueError):
+            self.eschema.check_columns({'name': [u'a'], 'age': [1, 2]})
+
+
+if __name__ == '__main__':
+    unittest_main()
@@ -23,8 +23,19 @@ if PY2:
 else:
     import unittest
 
+from copy import deepcopy
+
+from six.moves import cPickle as pickle
+
 from logilab.common.testlib import mock_object
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import yams
+
 from yams.constraints import *
 # after import *
 from datetime import datetime, date, timedelta
@@ -197,5 +208,231 @@ class ConstraintTC(unittest.TestCase):
                 self.assertEqual(cstr.failed_message('key', 'value', object()),
                                  ('constraint failed, you monkey!', {}))
 
+    def test_canonical_key_cache(self):
+        cstr = SizeConstraint(max=42)
+        key = cstr.canonical_key()
+        self.assertEqual(key, ('SizeConstraint', cstr.serialize()))
+        self.assertIs(cstr.canonical_key(), key)
+        # setting an attribute invalidates the key
+        cstr.max = 12
+        self.assertEqual(cstr.serialize(), u'{"max": 12, "min": null, "msg": null}')
+        self.assertEqual(cstr, SizeConstraint(max=12))
+        self.assertEqual(hash(cstr), hash(SizeConstraint(max=12)))
+        self.assertNotEqual(cstr, SizeConstraint(max=42))
+
+    def test_custom_serialize(self):
+        class MyConstraint(BaseConstraint):
+            def __init__(self, value):
+                super(MyConstraint, self).__init__()
+                self.value = value
+            def serialize(self):
+                return u'%s %s' % (self.value, super(MyConstraint, self).serialize())
+        cstr = MyConstraint(1)
+        self.assertEqual(cstr.serialize(), u'1 {"msg": null}')
+        self.assertEqual(cstr.canonical_key(), ('MyConstraint', u'1 {"msg": null}'))
+        self.assertEqual(cstr, MyConstraint(1))
+        self.assertNotEqual(cstr, MyConstraint(2))
+
+    def test_freeze(self):
+        cstr = IntervalBoundConstraint(0, 42)
+        self.assertFalse(cstr.frozen)
+        self.assertIs(cstr.freeze(), cstr)
+        self.assertTrue(cstr.frozen)
+        with self.assertRaises(AttributeError):
+            cstr.maxvalue = 12
+        self.assertEqual(cstr, IntervalBoundConstraint(0, 42))
+        # copies are not frozen
+        cstrcopy = deepcopy(cstr)
+        self.assertFalse(cstrcopy.frozen)
+        self.assertEqual(cstrcopy, cstr)
+        cstrcopy.maxvalue = 12
+        self.assertEqual(cstrcopy, IntervalBoundConstraint(0, 12))
+        cstr = pickle.loads(pickle.dumps(cstr))
+        self.assertFalse(cstr.frozen)
+        self.assertEqual(cstr, IntervalBoundConstraint(0, 42))
+
+    def test_vocabulary_check(self):
+        cstr = StaticVocabularyConstraint([u'b', u'a', 1])
+        self.assertTrue(cstr.check(None, 'attr', u'a'))
+        self.assertTrue(cstr.check(None, 'attr', 1))
+        self.assertFalse(cstr.check(None, 'attr', u'c'))
+        self.assertFalse(cstr.check(None, 'attr', [u'a']))
+        # values order is kept
+        self.assertEqual(cstr.vocabulary(), (u'b', u'a', 1))
+        cstr.values = (u'c',)
+        self.assertTrue(cstr.check(None, 'attr', u'c'))
+        self.assertFalse(cstr.check(None, 'attr', u'a'))
+        self.assertTrue(FormatConstraint().check(None, 'attr', u'text/html'))
+        self.assertFalse(FormatConstraint().check(None, 'attr', u'text/xml'))
+
+    def test_vocabulary_check_unhashable(self):
+        cstr = StaticVocabularyConstraint([[1, 2], u'a'])
+        self.assertTrue(cstr.check(None, 'attr', [1, 2]))
+        self.assertTrue(cstr.check(None, 'attr', u'a'))
+        self.assertFalse(cstr.check(None, 'attr', [1]))
+        cstr = MultipleStaticVocabularyConstraint([u'a', u'b'])
+        self.assertTrue(cstr.check(None, 'attr', [u'a', u'b']))
+        self.assertFalse(cstr.check(None, 'attr', [u'a', u'c']))
+        self.assertFalse(cstr.check(None, 'attr', [[u'a']]))
+
+    def test_dynamic_vocabulary(self):
+        class DynamicVocabularyConstraint(StaticVocabularyConstraint):
+            def vocabulary(self, entity=None, **kwargs):
+                return entity.choices
+        cstr = DynamicVocabularyConstraint(())
+        entity = mock_object(choices=(u'a',))
+        self.assertTrue(cstr.check(entity, 'attr', u'a'))
+        self.assertFalse(cstr.check(entity, 'attr', u'b'))
+
+    def test_compiled_checks(self):
+        cstr = IntervalBoundConstraint(0, 10)
+        self.assertTrue(cstr.check(None, 'hip', 10))
+        self.assertFalse(cstr.check(None, 'hip', 11))
+        self.assertIn('check', cstr.__dict__)
+        # setting a boundary recompiles the check
+        cstr.maxvalue = None
+        self.assertTrue(cstr.check(None, 'hip', 11))
+        self.assertFalse(cstr.check(None, 'hip', -1))
+        cstr.minvalue = Attribute('hop')
+        self.assertFalse(cstr.check(mock_object(hop=12), 'hip', 11))
+        self.assertTrue(cstr.check(mock_object(hop=None), 'hip', 11))
+        cstr = BoundaryConstraint('>', 1)
+        self.assertTrue(cstr.check(None, 'hip', 2))
+        cstr.operator = '<'
+        self.assertFalse(cstr.check(None, 'hip', 2))
+        # compiled check isn't pickled
+        cstr = pickle.loads(pickle.dumps(cstr))
+        self.assertNotIn('check', cstr.__dict__)
+        self.assertFalse(cstr.check(None, 'hip', 2))
+
+    def test_compiled_check_overridden(self):
+        class PositiveConstraint(BoundaryConstraint):
+            def check(self, entity, rtype, value):
+                return value != 42 and super(PositiveConstraint, self).check(
+                    entity, rtype, value)
+        cstr = PositiveConstraint('>', 0)
+        for i in range(2):
+            self.assertTrue(cstr.check(None, 'hip', 1))
+            self.assertFalse(cstr.check(None, 'hip', 42))
+
+    def test_fixed_clock(self):
+        calls = []
+        def now():
+            calls.append(None)
+            return datetime(2016, 1, len(calls))
+        orig_now = yams.KEYWORD_MAP['Datetime']['NOW']
+        yams.KEYWORD_MAP['Datetime']['NOW'] = now
+        try:
+            cstr = BoundaryConstraint('<=', NOW())
+            with fixed_clock():
+                self.assertTrue(cstr.check(None, 'hip', datetime(2016, 1, 1)))
+                with fixed_clock():
+                    self.assertTrue(cstr.check(None, 'hip', datetime(2016, 1, 1)))
+                self.assertTrue(cstr.check(None, 'hip', datetime(2016, 1, 1)))
+            self.assertEqual(len(calls), 1)
+            self.assertFalse(cstr.check(None, 'hip', datetime(2016, 1, 3)))
+            self.assertEqual(len(calls), 2)
+        finally:
+            yams.KEYWORD_MAP['Datetime']['NOW'] = orig_now
+
+    def test_check_array(self):
+        if numpy is None:
+            self.skipTest('numpy is not available')
+        values = [u'a', u'abc', u'abcdef']
+        for cstr, expected in (
+                (UniqueConstraint(), [True, True, True]),
+                (SizeConstraint(max=3), [True, True, False]),
+                (SizeConstraint(min=2, max=3), [False, True, False]),
+                (RegexpConstraint(u'ab'), [False, True, True]),
+                (StaticVocabularyConstraint([u'a', u'abc']), [True, True, False]),
+                (BoundaryConstraint('<', u'abc'), [True, False, False]),
+                (IntervalBoundConstraint(u'abc'), [False, True, True])):
+            for array in (values, numpy.array(values)):
+                with self.subTest(cstr=cstr, array=type(array)):
+                    self.assertEqual(cstr.check_array(array).tolist(), expected)
+                    self.assertEqual(expected, [bool(cstr.check(None, 'attr', value))
+                                                for value in values])
+        cstr = IntervalBoundConstraint(0, 10)
+        self.assertEqual(cstr.check_array(numpy.array([-1, 0, 10, 11, numpy.nan])).tolist(),
+                         [False, True, True, False, True])
+        cstr = BoundaryConstraint('<=', TODAY())
+        self.assertEqual(cstr.check_array([date.today(), date.today() + timedelta(1)]).tolist(),
+                         [True, False])
+        cstr = MultipleStaticVocabularyConstraint([1, 2])
+        self.assertEqual(cstr.check_array([[1], [1, 3]]).tolist(), [True, False])
+        with self.assertRaises(ValueError):
+            cstr.check_array(numpy.ones((2, 2)))
+
+    def test_check_array_entities(self):
+        if numpy is None:
+            self.skipTest('numpy is not available')
+        cstr = BoundaryConstraint('<=', Attribute('hop'))
+        entities = [mock_object(hop=1), mock_object(hop=2), mock_object(hop=None)]
+        self.assertEqual(cstr.check_array(numpy.array([2, 2, 2]), entities).tolist(),
+                         [False, True, True])
+        class MyConstraint(BaseConstraint):
+            def check(self, entity, rtype, value):
+                return value == entity.hop
+        self.assertEqual(MyConstraint().check_array([1, 1, 1], entities).tolist(),
+                         [True, False, False])
+        # vectorized implementations aren't used by subclasses overriding check
+        class OddConstraint(SizeConstraint):
+            def check(self, entity, rtype, value):
+                return len(value) % 2
+        self.assertEqual(OddConstraint(max=2).check_array([u'a', u'ab']).tolist(),
+                         [True, False])
+
+    def test_intern_constraint(self):
+        cstr = SizeConstraint(max=4242)
+        interned = intern_constraint(cstr)
+        # a frozen copy is interned, the given constraint is left unchanged
+        self.assertIsNot(interned, cstr)
+        self.assertEqual(interned, cstr)
+        self.assertTrue(interned.frozen)
+        self.assertFalse(cstr.frozen)
+        self.assertIs(intern_constraint(SizeConstraint(max=4242)), interned)
+        self.assertIs(intern_constraint(interned), interned)
+        other = SizeConstraint(max=4243)
+        self.assertIsNot(intern_constraint(other), interned)
+        # constraints of different classes are never shared
+        class MySizeConstraint(SizeConstraint):
+            pass
+        mycstr = MySizeConstraint(max=4242)
+        self.assertIs(intern_constraint(mycstr), mycstr)
+        # nor constraints whose serialized form may miss some parameters
+        class MinLen(BaseConstraint):
+            def __init__(self, n):
+                super(MinLen, self).__init__()
+                self.n = n
+        self.assertEqual(MinLen(2).canonical_key(), MinLen(10).canonical_key())
+        mincstr = MinLen(2)
+        self.assertIs(intern_constraint(mincstr), mincstr)
+        self.assertFalse(mincstr.frozen)
+        self.assertEqual(intern_constraint(MinLen(10)).n, 10)
+        # unless their class defines its own serialization
+        class MyMinLen(MinLen):
+            def _serialize(self):
+                return cstr_json_dumps({u'n': self.n})
+        self.assertIsNot(intern_constraint(MyMinLen(2)), intern_constraint(MyMinLen(10)))
+        mycstr = MyMinLen(2)
+        self.assertIs(intern_constraint(MyMinLen(2)), intern_constraint(mycstr))
+        # constraints which can't be serialized are left unchanged
+        cstr = IntervalBoundConstraint(object())
+        self.assertIs(intern_constraint(cstr), cstr)
+        self.assertFalse(cstr.frozen)
+
+    def test_intern_constraints(self):
+        cstr = StaticVocabularyConstraint([u'interned'])
+        constraints = [StaticVocabularyConstraint([u'interned']), cstr]
+        interned = intern_constraints(constraints)
+        # the given list is left unchanged
+        self.assertIsInstance(interned, list)
+        self.assertIsNot(constraints[0], constraints[1])
+        self.assertIs(interned[0], interned[1])
+        interned = intern_constraints((cstr,))
+        self.assertIsInstance(interned, tuple)
+        self.assertIs(interned[0], intern_constraint(cstr))
+
+
 if __name__ == '__main__':
     unittest.main()
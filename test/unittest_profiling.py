@@ -0,0 +1,71 @@
+# copyright 2016 LOGILAB S.A. (Paris, FRANCE), all rights reserved.
+# contact http://www.logilab.fr/ -- mailto:contact@logilab.fr
+#
+# This file is part of yams.
+#
+# yams is free software: you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# yams is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with yams. If not, see <http://www.gnu.org/licenses/>.
+"""unit tests for module yams.profiling"""
+
+import json
+import sys
+import os.path as osp
+
+from logilab.common.testlib import TestCase, unittest_main
+
+from yams.profiling import BuildProfile, PhaseStats
+from yams.reader import SchemaLoader
+
+sys.path.insert(0, osp.dirname(__file__))
+
+
+class BuildProfileTC(TestCase):
+
+    def test_phases(self):
+        profile = BuildProfile()
+        with profile.phase('b'):
+            pass
+        profile.add('a', 1., calls=3)
+        profile.add('b', 2.)
+        self.assertEqual([stats.name for stats in profile.report()], ['b', 'a'])
+        self.assertEqual(profile['a'], PhaseStats('a', 3, 1.))
+        self.assertEqual(profile['b'].calls, 2)
+        self.assertGreaterEqual(profile['b'].time, 2.)
+        self.assertAlmostEqual(profile.total, profile['a'].time + profile['b'].time)
+        self.assertNotIn('c', profile)
+        data = json.loads(json.dumps(profile.as_dict()))
+        self.assertEqual([stats['name'] for stats in data['phases']], ['b', 'a'])
+        lines = profile.format().splitlines()
+        self.assertEqual([line.split()[0] for line in lines],
+                         ['phase', 'b', 'a', 'total'])
+
+    def test_load(self):
+        modnames = [('data', 'data.schema')] + [
+            ('data', 'data.schema.%s' % name)
+            for name in ('State', 'Dates', 'Company', 'schema')]
+        loader = SchemaLoader()
+        loader.load(modnames)
+        self.assertIsNone(loader.profile)
+        loader.load(modnames, profile=True)
+        profile = loader.profile
+        for name in ('exec_file data.schema.State', 'expand_type_definitions',
+                     'add types', 'expand_relation_definitions', 'finalize',
+                     'check_permission_definitions', 'check_unique_together',
+                     'remove_unused_relation_types'):
+            self.assertIn(name, profile)
+        self.assertEqual(profile['exec_file data.schema.State'].calls, 1)
+        self.assertGreater(profile['expand_relation_definitions'].calls, 1)
+
+
+if __name__ == '__main__':
+    unittest_main()
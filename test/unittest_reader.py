@@ -18,14 +18,22 @@
 """unit tests for module yams.reader"""
 
 import sys
+import os
 import os.path as osp
+import shutil
+import stat
+import marshal
+import tempfile
+import warnings
 from datetime import datetime, date, time
 
 from logilab.common.testlib import TestCase, unittest_main
 
-from yams import BadSchemaDefinition, DEFAULT_RELPERMS, DEFAULT_ATTRPERMS
+from yams import (BadSchemaDefinition, DEFAULT_RELPERMS, DEFAULT_ATTRPERMS,
+                  register_base_type, unregister_base_type)
 from yams.schema import Schema
-from yams.reader import SchemaLoader, build_schema_from_namespace
+from yams.reader import (SchemaLoader, build_schema_from_namespace, CACHE_STATS,
+                         _atomic_write)
 from yams.constraints import StaticVocabularyConstraint, SizeConstraint
 from yams.buildobjs import (EntityType, RelationType, RelationDefinition,
                             SubjectRelation, ComputedRelation,
@@ -304,6 +312,260 @@ class SchemaLoaderModnamesTC(SchemaLoaderTC):
         cls.schema = SchemaLoader().load(modnames())
 
 
+class LazySchemaLoaderTC(SchemaLoaderTC):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.schema = SchemaLoader().load([cls.datadir], lazy=True)
+
+
+class LazyLoadingTC(TestCase):
+
+    def load(self, **kwargs):
+        return SchemaLoader().load([self.datadir], **kwargs)
+
+    def test_materialize_on_access(self):
+        schema = self.load(lazy=True)
+        self.assertIn('_pending_rdefs', schema._relations['travaille'].__dict__)
+        eschema = schema.eschema('Person')
+        self.assertIn('_pending_rels', eschema.__dict__)
+        self.assertIn('travaille', eschema.subject_relations())
+        self.assertNotIn('_pending_rels', eschema.__dict__)
+        self.assertNotIn('_pending_rdefs', schema._relations['travaille'].__dict__)
+        # relations not involving Person nor its parents are still pending
+        self.assertIn('_pending_rdefs', schema._relations['next_state'].__dict__)
+        self.assertIn('_pending_rels', schema._entities['State'].__dict__)
+        # navigation from a relation schema materializes its definitions
+        self.assertEqual(sorted(schema['next_state'].objects()), ['State'])
+        self.assertIn('_pending_rels', schema._entities['State'].__dict__)
+        self.assertIn('next_state', schema['State'].subject_relations())
+
+    def test_same_schema(self):
+        expected = self.load()
+        schema = self.load(lazy=True)
+        # access some entity schema first, so that relation definitions are
+        # added in a different order
+        schema['Societe'].subject_relations()
+        self.assertEqual(sorted(schema.relations()), sorted(expected.relations()))
+        self.assertEqual(sorted(schema.entities()), sorted(expected.entities()))
+        self.assertEqual(schema._pending_etypes, None)
+        for eschema in expected.entities():
+            leschema = schema[eschema.type]
+            self.assertEqual(sorted(leschema.subject_relations()),
+                             sorted(eschema.subject_relations()))
+            self.assertEqual(sorted(leschema.object_relations()),
+                             sorted(eschema.object_relations()))
+        for rschema in expected.relations():
+            lrschema = schema[rschema.type]
+            self.assertEqual(sorted(lrschema.rdefs), sorted(rschema.rdefs))
+            for key, rdef in rschema.rdefs.items():
+                lrdef = lrschema.rdefs[key]
+                self.assertEqual(lrdef.infered, rdef.infered)
+                self.assertEqual(lrdef.cardinality, rdef.cardinality)
+                self.assertEqual(lrdef.permissions, rdef.permissions)
+
+    def test_freeze(self):
+        schema = self.load(lazy=True).freeze()
+        self.assertIsNone(schema._pending_etypes)
+        self.assertIn('travaille', schema['Person'].subject_relations())
+
+    def test_add_relation_def(self):
+        schema = self.load(lazy=True)
+        schema.add_relation_def(RelationDefinition('Person', 'travaille', 'Person'))
+        self.assertEqual(sorted(schema['travaille'].objects()),
+                         ['Person', 'Salaried', 'Societe'])
+        self.assertIn('travaille', schema['Person'].object_relations())
+
+
+class ParallelCompileTC(TestCase):
+
+    modnames = [('data', 'data.schema')] + [
+        ('data', 'data.schema.%s' % name)
+        for name in ('State', 'Dates', 'Company', 'schema')]
+
+    def test_compile_processes(self):
+        loader = SchemaLoader()
+        schema = loader.load(self.modnames, compile_processes=2)
+        self.assertEqual(loader._compiled, {})
+        expected = SchemaLoader().load(self.modnames)
+        self.assertEqual(len(expected.loaded_files), 5)
+        self.assertEqual(schema.loaded_files, expected.loaded_files)
+        self.assertEqual(sorted(schema.entities()), sorted(expected.entities()))
+        for rschema in expected.relations():
+            self.assertEqual(sorted(schema[rschema].rdefs), sorted(rschema.rdefs))
+
+    def test_compile_error(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            os.mkdir(osp.join(tmpdir, 'badschema'))
+            open(osp.join(tmpdir, 'badschema', '__init__.py'), 'w').close()
+            with open(osp.join(tmpdir, 'badschema', 'schema.py'), 'w') as f:
+                f.write('class (:\n')
+            sys.path.insert(0, tmpdir)
+            with self.assertRaises(SyntaxError):
+                SchemaLoader().load([('badschema', 'badschema.schema')],
+                                    compile_processes=2)
+        finally:
+            sys.path.remove(tmpdir)
+            sys.modules.pop('badschema', None)
+            shutil.rmtree(tmpdir)
+
+
+class SchemaCacheTC(TestCase):
+    schema_module = """
+from yams.buildobjs import EntityType, String
+
+class Card(EntityType):
+    title = String(required=True, maxsize=%s)
+"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_dir = osp.join(self.tmpdir, 'cache')
+        pkgdir = osp.join(self.tmpdir, 'cachedschema')
+        os.mkdir(pkgdir)
+        open(osp.join(pkgdir, '__init__.py'), 'w').close()
+        self.write_schema(64)
+        sys.path.insert(0, self.tmpdir)
+
+    def tearDown(self):
+        sys.path.remove(self.tmpdir)
+        sys.modules.pop('cachedschema', None)
+        shutil.rmtree(self.tmpdir)
+
+    def write_schema(self, maxsize):
+        with open(osp.join(self.tmpdir, 'cachedschema', 'schema.py'), 'w') as f:
+            f.write(self.schema_module % maxsize)
+
+    def load(self, **kwargs):
+        loader = SchemaLoader()
+        schema = loader.load([('cachedschema', 'cachedschema.schema')],
+                             cache_dir=self.cache_dir, **kwargs)
+        return loader, schema
+
+    def test_hit_and_miss(self):
+        stats = dict(CACHE_STATS)
+        loader, schema = self.load()
+        self.assertFalse(loader.cache_hit)
+        self.assertIn('Card', loader.defined)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        loader, cached = self.load()
+        self.assertTrue(loader.cache_hit)
+        self.assertEqual(CACHE_STATS['hits'], stats['hits'] + 1)
+        self.assertEqual(CACHE_STATS['misses'], stats['misses'] + 1)
+        self.assertEqual(cached.entities(), schema.entities())
+        self.assertEqual(cached.loaded_files, schema.loaded_files)
+        self.assertEqual(cached['Card'].rdef('title').constraints,
+                         schema['Card'].rdef('title').constraints)
+        # schema files aren't executed on a cache hit
+        self.assertEqual(loader.defined, {})
+
+    def test_invalidation(self):
+        self.load()
+        # other loading arguments
+        loader, schema = self.load(name='Other')
+        self.assertFalse(loader.cache_hit)
+        self.assertEqual(schema.name, 'Other')
+        # schema file changed
+        self.write_schema(128)
+        loader, schema = self.load()
+        self.assertFalse(loader.cache_hit)
+        self.assertEqual(
+            schema['Card'].rdef('title').constraint_by_type('SizeConstraint').max,
+            128)
+        # base types changed
+        register_base_type('Cache')
+        try:
+            loader, schema = self.load()
+            self.assertFalse(loader.cache_hit)
+        finally:
+            unregister_base_type('Cache')
+        loader, schema = self.load()
+        self.assertTrue(loader.cache_hit)
+
+    def test_bytecode_cache(self):
+        loader = SchemaLoader()
+        loader.bytecode_cache_dir = osp.join(self.tmpdir, 'bytecode')
+        modnames = [('cachedschema', 'cachedschema.schema')]
+        loader.load(modnames)
+        schemafile = osp.join(self.tmpdir, 'cachedschema', 'schema.py')
+        cachefile, header = loader._bytecode_file(schemafile)
+        self.assertTrue(osp.exists(cachefile))
+        # cached code is used as long as the source file is unchanged
+        with open(cachefile, 'wb') as stream:
+            stream.write(header)
+            marshal.dump(compile(self.schema_module.replace('Card', 'Cached')
+                                 % 64, schemafile, 'exec'), stream)
+        schema = loader.load(modnames)
+        self.assertIn('Cached', schema)
+        self.write_schema(128)
+        schema = loader.load(modnames)
+        self.assertIn('Card', schema)
+        self.assertEqual(
+            schema['Card'].rdef('title').constraint_by_type('SizeConstraint').max,
+            128)
+
+    def test_cache_write_failure(self):
+        loader = SchemaLoader()
+        def store_cache(schema, cachefile):
+            _atomic_write(cachefile, lambda path: 1 / 0)
+        loader._store_cache = store_cache
+        with self.assertRaises(ZeroDivisionError):
+            loader.load([('cachedschema', 'cachedschema.schema')],
+                        cache_dir=self.cache_dir)
+        # the temporary file is removed
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_cache_store_failure(self):
+        # unpicklable default value
+        with open(osp.join(self.tmpdir, 'cachedschema', 'schema.py'), 'a') as f:
+            f.write("\nclass Note(EntityType):\n"
+                    "    title = String(default=lambda: u'x')\n")
+        with warnings.catch_warnings(record=True) as warned:
+            warnings.simplefilter('always')
+            loader, schema = self.load()
+        self.assertIn('Note', schema)
+        self.assertTrue(any('unable to store schema cache' in str(w.message)
+                            for w in warned))
+        self.assertEqual(os.listdir(self.cache_dir), [])
+        # unwritable cache directory
+        self.cache_dir = osp.join(self.tmpdir, 'cachedschema', 'schema.py')
+        with warnings.catch_warnings(record=True):
+            warnings.simplefilter('always')
+            loader, schema = self.load()
+        self.assertIn('Note', schema)
+
+    def test_cache_files_mode(self):
+        umask = os.umask(0o022)
+        try:
+            self.load()
+        finally:
+            os.umask(umask)
+        cachefile = osp.join(self.cache_dir, os.listdir(self.cache_dir)[0])
+        self.assertEqual(stat.S_IMODE(os.stat(cachefile).st_mode), 0o644)
+
+    def test_bytecode_file_non_ascii_path(self):
+        loader = SchemaLoader()
+        loader.bytecode_cache_dir = osp.join(self.tmpdir, 'bytecode')
+        schemafile = osp.join(self.tmpdir, u'sch\xe9ma.py')
+        open(schemafile, 'w').close()
+        cachefile, header = loader._bytecode_file(schemafile)
+        self.assertEqual(loader._bytecode_file(
+            schemafile.encode(sys.getfilesystemencoding())),
+                         (cachefile, header))
+
+    def test_invalid_cache(self):
+        loader, schema = self.load()
+        cachefile = osp.join(self.cache_dir, os.listdir(self.cache_dir)[0])
+        with open(cachefile, 'wb') as f:
+            f.write(b'garbage')
+        loader, schema = self.load()
+        self.assertFalse(loader.cache_hit)
+        self.assertEqual(schema.entities()[-1], 'Card')
+        loader, schema = self.load()
+        self.assertTrue(loader.cache_hit)
+
+
 class BasePerson(EntityType):
     firstname = String(vocabulary=('logilab', 'caesium'), maxsize=10)
     lastname = String(constraints=[StaticVocabularyConstraint(['logilab', 'caesium'])])
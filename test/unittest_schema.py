@@ -20,22 +20,23 @@
 
 from logilab.common.testlib import TestCase, unittest_main
 
+import warnings
 from copy import copy, deepcopy
 from tempfile import mktemp
 
 from six import text_type
 
 from yams import (BASE_TYPES, ValidationError, BadSchemaDefinition,
-                  register_base_type, unregister_base_type)
+                  DEFAULT_RELPERMS, FrozenSchemaError, register_base_type, unregister_base_type)
 from yams.buildobjs import (register_base_types, make_type, _add_relation,
                             EntityType, RelationType, RelationDefinition,
-                            RichString)
+                            RichString, String)
 from yams.schema import Schema, RelationDefinitionSchema
 from yams.interfaces import IVocabularyConstraint
 from yams.constraints import (BASE_CHECKERS, SizeConstraint, RegexpConstraint,
                               StaticVocabularyConstraint, IntervalBoundConstraint,
-                              FormatConstraint)
-from yams.reader import SchemaLoader
+                              FormatConstraint, BaseConstraint)
+from yams.reader import SchemaLoader, build_schema_from_namespace
 from yams.buildobjs import register_base_types
 
 
@@ -213,6 +214,27 @@ class EntitySchemaTC(BaseSchemaTC):
         self.assertEqual(rgx_cstr2.flags, rgx_cstr.flags)
         self.assertEqual(rgx_cstr2._rgx, rgx_cstr._rgx)
 
+    def test_copy(self):
+        ceperson = copy(eperson)
+        self.assertIsNot(ceperson, eperson)
+        self.assertIs(ceperson.schema, schema)
+        self.assertEqual(ceperson.subjrels, eperson.subjrels)
+        rdef = eperson.rdef('nom')
+        crdef = copy(rdef)
+        self.assertIsNot(crdef, rdef)
+        self.assertIs(crdef.rtype, rdef.rtype)
+        self.assertEqual(crdef.cardinality, rdef.cardinality)
+        crdef.eid = 42
+        self.assertFalse(hasattr(rdef, 'eid'))
+
+    def test_deepcopy_schema_object(self):
+        """deep copies of schema objects belong to a deep copy of their schema"""
+        deperson = deepcopy(eperson)
+        self.assertIsNot(deperson.schema, schema)
+        self.assertIs(deperson, deperson.schema['Person'])
+        drdef = deepcopy(eperson.rdef('nom'))
+        self.assertIs(drdef, drdef.rtype.schema['Person'].rdef('nom'))
+
     def test_deepcopy(self):
         global schema
         schema = deepcopy(schema)
@@ -304,6 +326,27 @@ class EntitySchemaTC(BaseSchemaTC):
         self.assertEqual(eperson.destination('nom'), 'String')
         self.assertEqual(eperson.destination('travaille'), 'Societe')
 
+    def test_rdef_index(self):
+        rdef = eperson.rdef('concerne', targettype='Affaire')
+        self.assertIs(rdef, rconcerne.rdefs[(eperson, eaffaire)])
+        self.assertIs(eperson.rdef('concerne', targettype='Affaire'), rdef)
+        self.assertIs(eperson.rdef(rconcerne, 'subject', eaffaire), rdef)
+        self.assertIs(eaffaire.rdef('concerne', 'object', 'Person'), rdef)
+        # the warning is emitted on each ambiguous access
+        for i in range(2):
+            with warnings.catch_warnings(record=True) as warns:
+                warnings.simplefilter('always')
+                eperson.rdef('concerne')
+            self.assertEqual(len(warns), 1)
+        schema.del_relation_def('Person', 'concerne', 'Affaire')
+        self.assertRaises(KeyError, eperson.rdef, 'concerne', targettype='Affaire')
+        self.assertRaises(KeyError, eaffaire.rdef, 'concerne', 'object', 'Person')
+        self.assertIs(eperson.rdef('concerne'),
+                      rconcerne.rdefs[(eperson, esociete)])
+        schema.add_relation_def(RelationDefinition('Person', 'concerne', 'Affaire'))
+        self.assertIs(eperson.rdef('concerne', targettype='Affaire'),
+                      rconcerne.rdefs[(eperson, eaffaire)])
+
     def test_check_unique_together1(self):
         eperson._unique_together = [('prenom', 'nom')]
         eperson.check_unique_together()
@@ -382,6 +425,21 @@ class RelationSchemaTC(BaseSchemaTC):
         assoc_types.sort()
         self.assertEqual(assoc_types, expected)
 
+    def test_rdef_attributes(self):
+        rdef = rnom.rdefs[('Person', 'String')]
+        self.assertFalse(hasattr(rdef, '__dict__'))
+        self.assertEqual(rdef.get('internationalizable'), False)
+        self.assertEqual(rdef.get('composite', 'nope'), 'nope')
+        self.assertRaises(AttributeError, getattr, rdef, 'unknown')
+        # attributes which are not relation definition properties
+        rdef.eid = 42
+        self.assertEqual(rdef.eid, 42)
+        self.assertEqual(rdef.get('eid'), 42)
+        self.assertEqual(rdef.__getstate__()['eid'], 42)
+        clone = rdef.dump(rdef.subject, rdef.object)
+        self.assertEqual(clone.eid, 42)
+        self.assertEqual(clone.constraints, rdef.constraints)
+
 #     def test_reverse_association_types(self):
 #         expected = [ ('Affaire', ['Person']),
 #                      ('Societe', ['Person', 'Affaire'])]
@@ -487,6 +545,64 @@ class SchemaTC(BaseSchemaTC):
                          {'fax-subject': u'value 1000001 must be <= 999999',
                           'tel-subject': u'value 1000000 must be <= 999999'})
 
+    def test_compile_validator(self):
+        eschema = schema.eschema('Person')
+        validator = eschema.compile_validator()
+        self.assertIs(eschema.compile_validator(), validator)
+        with self.assertRaises(ValidationError) as cm:
+            validator({'nom': 1, 'promo': 2})
+        cm.exception.translate(text_type)
+        self.assertEqual(cm.exception.errors,
+                         {'nom-subject': u'incorrect value (1) for type "String"',
+                          'promo-subject': u'incorrect value (2) for type "String"'})
+        entity = {'sexe': '0.5'}
+        validator(entity)
+        self.assertEqual(entity['sexe'], 0.5)
+
+    def test_compile_validator_invalidation(self):
+        eschema = schema.eschema('Person')
+        validator = eschema.compile_validator()
+        validator({'prenom': u'x'*50})
+        # setting other attributes than relation properties doesn't modify
+        # the schema
+        eschema.rdef('prenom').eid = 42
+        self.assertIs(eschema.compile_validator(), validator)
+        eschema.rdef('prenom').constraints = [SizeConstraint(32)]
+        self.assertIsNot(eschema.compile_validator(), validator)
+        # in-place modifications of constraints are taken into account
+        eschema.rdef('prenom').constraints.append(SizeConstraint(4))
+        with self.assertRaises(ValidationError):
+            eschema.check({'prenom': u'x'*8})
+        del eschema.rdef('prenom').constraints[-1]
+        eschema.check({'prenom': u'x'*8})
+        with self.assertRaises(ValidationError) as cm:
+            eschema.check({'prenom': u'x'*50})
+        cm.exception.translate(text_type)
+        self.assertEqual(cm.exception.errors,
+                         {'prenom-subject': u'value should have maximum size of 32 but found 50'})
+        eschema.rdef('prenom').cardinality = '11'
+        with self.assertRaises(ValidationError) as cm:
+            eschema.check({}, creation=True)
+        self.assertIn('prenom-subject', cm.exception.errors)
+
+    def test_check_many(self):
+        eschema = schema.eschema('Person')
+        entities = [{'nom': 1}, {'tel': 83433}, {'tel': 1000000}]
+        errors = eschema.check_many(iter(entities))
+        self.assertEqual([ex.entity for ex in errors], [entities[0], entities[2]])
+        for ex in errors:
+            ex.translate(text_type)
+        self.assertEqual(errors[0].errors,
+                         {'nom-subject': u'incorrect value (1) for type "String"'})
+        self.assertEqual(errors[1].errors,
+                         {'tel-subject': u'value 1000000 must be <= 999999'})
+        self.assertEqual(eschema.check_many(entities[1:2]), [])
+        with self.assertRaises(ValidationError) as cm:
+            eschema.check_many(entities, failfast=True)
+        self.assertIs(cm.exception.entity, entities[0])
+        errors = eschema.check_many([{}], creation=True)
+        self.assertEqual(list(errors[0].errors), ['nom-subject'])
+
     def test_validation_error_translation_4(self):
         verr = ValidationError(1, {None: 'global message about eid %(eid)s'}, {'eid': 1})
         verr.translate(text_type)
@@ -521,6 +637,88 @@ class SchemaTC(BaseSchemaTC):
         self.assertEqual(eperson.ordered_relations(), pschema['Person'].ordered_relations())
         self.assertEqual(eperson.object_relations(), pschema['Person'].object_relations())
 
+    def test_pickle_references(self):
+        """schema objects pickled along with their schema are restored from it"""
+        import pickle
+        rdef = eperson.rdef('nom')
+        pschema, peperson, prdef, prconcerne = pickle.loads(pickle.dumps(
+            [schema, eperson, rdef, schema['concerne']]))
+        self.assertIs(peperson, pschema['Person'])
+        self.assertIs(prconcerne, pschema['concerne'])
+        self.assertIs(prdef, pschema['Person'].rdef('nom'))
+        self.assertIs(prdef.subject, peperson)
+        self.assertEqual(prdef.constraints, rdef.constraints)
+        self.assertEqual(prdef.cardinality, rdef.cardinality)
+        self.assertCountEqual(prconcerne.rdefs, schema['concerne'].rdefs)
+        # a single entity schema or relation definition is restored along with
+        # its schema
+        peperson = pickle.loads(pickle.dumps(eperson))
+        self.assertIs(peperson, peperson.schema['Person'])
+        prdef = pickle.loads(pickle.dumps(rdef))
+        self.assertIs(prdef, prdef.rtype.schema['Person'].rdef('nom'))
+        # objects which are not part of their schema anymore are pickled as is
+        crdef = copy(rdef)
+        pschema, pcrdef = pickle.loads(pickle.dumps([schema, crdef]))
+        self.assertIsNot(pcrdef, pschema['Person'].rdef('nom'))
+        self.assertEqual(pcrdef.cardinality, rdef.cardinality)
+
+
+    def test_role_rdefs(self):
+        self.assertCountEqual(eperson.role_rdefs('object'), [])
+        self.assertCountEqual([rdef.as_triple() for rdef in esociete.role_rdefs('object')],
+                              [('Person', 'travaille', 'Societe'),
+                               ('Person', 'concerne', 'Societe'),
+                               ('Affaire', 'concerne', 'Societe')])
+        self.assertEqual(len(eperson.role_rdefs()), 15)
+        byrole = rconcerne.rdefs_by_role('object')
+        self.assertCountEqual(byrole, ['Affaire', 'Societe'])
+        self.assertCountEqual(byrole['Societe'],
+                              [rconcerne.rdef('Person', 'Societe'),
+                               rconcerne.rdef('Affaire', 'Societe')])
+
+    def test_freeze(self):
+        rdefs = rconcerne.rdefs_by_role()
+        prdefs = eperson.role_rdefs()
+        self.assertIs(schema.freeze(), schema)
+        self.assertTrue(schema.frozen)
+        self.assertIsInstance(schema.entities(), tuple)
+        self.assertIs(schema.entities(), schema.entities())
+        self.assertIs(schema.relations(), schema.relations())
+        self.assertIs(eperson.subject_relations(), eperson.subject_relations())
+        self.assertIs(eperson.object_relations(), eperson.object_relations())
+        self.assertIs(rconcerne.objects('Person'), rconcerne.objects(eperson))
+        self.assertCountEqual(rconcerne.objects('Person'), ['Affaire', 'Societe'])
+        self.assertCountEqual(rconcerne.subjects(), ['Affaire', 'Person'])
+        self.assertRaises(KeyError, rconcerne.subjects, 'Person')
+        self.assertEqual(rconcerne.rdefs_by_role(), rdefs)
+        self.assertCountEqual(eperson.role_rdefs(), prdefs)
+        eperson.check({'nom': u'>10 mais < 20 '})
+        with self.assertRaises(FrozenSchemaError):
+            schema.add_entity_type(EntityType('Machin'))
+        with self.assertRaises(FrozenSchemaError):
+            schema.del_relation_def('Person', 'concerne', 'Affaire')
+        with self.assertRaises(FrozenSchemaError):
+            eperson.rdef('nom').cardinality = '?1'
+        # attributes which aren't relation properties may still be set
+        eperson.rdef('nom').eid = 42
+        self.assertEqual(eperson.rdef('nom').eid, 42)
+        with self.assertRaises(FrozenSchemaError):
+            eperson.set_action_permissions('read', ())
+        with self.assertRaises(AttributeError):
+            eperson.rdef('nom').constraints[0].max = 42
+        self.assertEqual(eperson.rdef('nom').cardinality, '11')
+        self.assertCountEqual(rconcerne.objects('Person'), ['Affaire', 'Societe'])
+        self.assertIn('Person', schema)
+        self.assertNotIn('Machin', schema)
+
+    def test_pickle_frozen(self):
+        import pickle
+        pschema = pickle.loads(pickle.dumps(schema.freeze()))
+        self.assertTrue(pschema.frozen)
+        self.assertCountEqual(pschema.entities(), schema.entities())
+        self.assertCountEqual(pschema['Person'].subject_relations(),
+                              eperson.subject_relations())
+        self.assertRaises(FrozenSchemaError, pschema.del_entity_type, 'Note')
 
     def test_rename_entity_type(self):
         affaire = schema.eschema('Affaire')
@@ -540,6 +738,170 @@ class SchemaTC(BaseSchemaTC):
         schema.__test__ = True
         self.assertEqual(workcase.rdef('concerne'), orig_rprops)
 
+    def test_add_relation_defs(self):
+        schema.add_relation_type(RelationType('tagged'))
+        rdefs = schema.add_relation_defs(
+            RelationDefinition('*', 'tagged', '*', cardinality='?*'),
+            ['Affaire', 'Note'], ['Person', 'Societe'])
+        self.assertEqual([(rdef.subject.type, rdef.object.type) for rdef in rdefs],
+                         [('Affaire', 'Person'), ('Note', 'Person'),
+                          ('Affaire', 'Societe'), ('Note', 'Societe')])
+        rschema = schema.rschema('tagged')
+        self.assertEqual(sorted(rschema.rdefs), sorted(
+            (rdef.subject, rdef.object) for rdef in rdefs))
+        self.assertEqual(sorted(rschema.subjects()), ['Affaire', 'Note'])
+        self.assertEqual(sorted(rschema.objects('Note')), ['Person', 'Societe'])
+        for rdef in rdefs:
+            self.assertEqual(rdef.cardinality, '?*')
+            self.assertEqual(rdef.permissions, DEFAULT_RELPERMS)
+        self.assertIsNot(rdefs[0].permissions, rdefs[1].permissions)
+        self.assertIn('tagged', eaffaire.subject_relations())
+        self.assertIn('tagged', eperson.object_relations())
+
+    def test_add_relation_defs_errors(self):
+        self.assertRaisesMsg(BadSchemaDefinition,
+                             "using unknown type 'Afire' in relation evaluee",
+                             schema.add_relation_defs,
+                             RelationDefinition('*', 'evaluee', 'Note'),
+                             ['Person', 'Afire'], ['Note'])
+        self.assertRaises(BadSchemaDefinition, schema.add_relation_defs,
+                          RelationDefinition('*', 'evaluee', '*'),
+                          ['Person'], ['Note', 'String'])
+
+    def test_bulk_build(self):
+        bschema = Schema('Test')
+        for etype in ('Person', 'Societe'):
+            bschema.add_entity_type(EntityType(etype))
+        bschema.add_relation_type(RelationType('knows'))
+        with bschema.bulk_build():
+            self.assertEqual(bschema._bulk_checks, {})
+            bschema.add_relation_def(RelationDefinition('Person', 'knows', 'Societe'))
+            bschema.add_relation_def(RelationDefinition('Societe', 'knows', 'Person'))
+        self.assertIsNone(bschema._bulk_checks)
+        self.assertEqual(sorted(bschema.rschema('knows').objects()),
+                         ['Person', 'Societe'])
+
+    def test_bulk_build_errors(self):
+        def new_schema():
+            bschema = Schema('Test')
+            register_base_types(bschema)
+            for etype in ('Person', 'Societe'):
+                bschema.add_entity_type(EntityType(etype))
+            bschema.add_relation_type(RelationType('knows'))
+            bschema.add_relation_type(RelationType('name'))
+            return bschema
+        def bulk_add(*rdefs):
+            bschema = new_schema()
+            with bschema.bulk_build():
+                for rdef in rdefs:
+                    bschema.add_relation_def(rdef)
+        # errors are only raised on exit
+        self.assertRaisesMsg(BadSchemaDefinition,
+                             "ambiguous relation: 'Societe.knows' is final (String) "
+                             "but not 'Societe.knows' (Societe)",
+                             bulk_add,
+                             RelationDefinition('Person', 'knows', 'Societe'),
+                             RelationDefinition('Societe', 'knows', 'String'),
+                             RelationDefinition('Societe', 'knows', 'Person'))
+        self.assertRaisesMsg(BadSchemaDefinition,
+                             "size constraint doesn't apply to Int entity type",
+                             bulk_add,
+                             RelationDefinition('Person', 'name', 'String',
+                                                constraints=[SizeConstraint(10)]),
+                             RelationDefinition('Societe', 'name', 'Int',
+                                                constraints=[SizeConstraint(10)]))
+        # nothing is checked if the block fails
+        bschema = new_schema()
+        with self.assertRaises(ZeroDivisionError):
+            with bschema.bulk_build():
+                bschema.add_relation_def(RelationDefinition('Person', 'name', 'Person'))
+                1 / 0
+        self.assertIsNone(bschema._bulk_checks)
+
+    def test_interned_constraints(self):
+        ischema = Schema('Test')
+        register_base_types(ischema)
+        ischema.add_entity_type(EntityType('Person'))
+        for rtype in ('name', 'firstname'):
+            ischema.add_relation_type(RelationType(rtype))
+            ischema.add_relation_def(RelationDefinition(
+                'Person', rtype, 'String', constraints=[SizeConstraint(64)]))
+        namerdef = ischema.rschema('name').rdef('Person', 'String')
+        firstnamerdef = ischema.rschema('firstname').rdef('Person', 'String')
+        # constraints of a schema being built may be modified in place
+        self.assertIsNot(namerdef.constraints[0], firstnamerdef.constraints[0])
+        namerdef.constraints[0].max = 32
+        self.assertEqual(firstnamerdef.constraints[0].max, 64)
+        namerdef.constraints[0].max = 64
+        # equal constraints share one frozen instance once the schema is frozen
+        constraints = namerdef.constraints
+        ischema.freeze()
+        cstr1 = namerdef.constraints[0]
+        self.assertIs(cstr1, firstnamerdef.constraints[0])
+        self.assertTrue(cstr1.frozen)
+        # constraints of the schema being built are left unchanged
+        self.assertIsNot(namerdef.constraints, constraints)
+        self.assertFalse(constraints[0].frozen)
+
+    def test_freeze_shared_definitions(self):
+        """freezing a schema doesn't freeze constraints of other schemas built
+        from the same definitions
+        """
+        class Card(EntityType):
+            title = String(maxsize=10)
+        schema1 = build_schema_from_namespace([('Card', Card)])
+        schema2 = build_schema_from_namespace([('Card', Card)])
+        schema1.freeze()
+        rdef2 = schema2['Card'].rdef('title')
+        rdef2.constraints[0].max = 20
+        self.assertEqual(rdef2.constraint_by_type('SizeConstraint').max, 20)
+        schema3 = build_schema_from_namespace([('Card', Card)])
+        self.assertFalse(schema3['Card'].rdef('title').constraints[0].frozen)
+        self.assertEqual(schema1['Card'].rdef('title').constraints[0].max, 10)
+        # nor constraints which can't be interned
+        class MinLen(BaseConstraint):
+            def __init__(self, n):
+                super(MinLen, self).__init__()
+                self.n = n
+        class Note(EntityType):
+            text = String(constraints=[MinLen(2)])
+        schema1 = build_schema_from_namespace([('Note', Note)])
+        schema2 = build_schema_from_namespace([('Note', Note)])
+        schema1.freeze()
+        self.assertTrue(schema1['Note'].rdef('text').constraints[0].frozen)
+        schema2['Note'].rdef('text').constraints[0].n = 3
+        self.assertEqual(schema1['Note'].rdef('text').constraints[0].n, 2)
+
+    def test_add_relation_defs_subclass(self):
+        added = []
+        class MySchema(Schema):
+            def add_relation_def(self, rdef):
+                added.append((rdef.subject, rdef.object))
+                return super(MySchema, self).add_relation_def(rdef)
+        myschema = MySchema('Test')
+        for etype in ('Person', 'Societe'):
+            myschema.add_entity_type(EntityType(etype))
+        myschema.add_relation_type(RelationType('knows'))
+        rdefs = myschema.add_relation_defs(
+            RelationDefinition('*', 'knows', '*'), ['Person', 'Societe'], ['Person'])
+        self.assertEqual(len(rdefs), 2)
+        self.assertEqual(added, [('Person', 'Person'), ('Societe', 'Person')])
+
+    def test_wildcard_etypes_cache(self):
+        defined = {}
+        for rtype in ('knows', 'likes'):
+            defined[rtype] = type(rtype, (RelationDefinition,),
+                                  {'subject': '*', 'object': 'Person'})
+            schema.add_relation_type(RelationType(rtype))
+        schema.add_entity_type(EntityType('Company'))
+        defined['knows'].expand_relation_definitions(defined, schema)
+        self.assertEqual(sorted(schema.rschema('knows').subjects()),
+                         ['Affaire', 'Company', 'Note', 'Person', 'Societe'])
+        schema.del_entity_type('Company')
+        defined['likes'].expand_relation_definitions(defined, schema)
+        self.assertEqual(sorted(schema.rschema('likes').subjects()),
+                         ['Affaire', 'Note', 'Person', 'Societe'])
+
     def test_inheritance_rdefs(self):
         class Plan(EntityType):
             pass
@@ -621,6 +983,17 @@ class CustomTypeTC(TestCase):
         self.assertNotIn('Test', RelationDefinitionSchema.BASE_TYPE_PROPERTIES)
         self.assertNotIn('Test', BASE_CHECKERS)
 
+    def test_rdef_properties_cache(self):
+        from yams.buildobjs import _RDEF_PROPERTIES, _REL_PROPERTIES
+        rdefprops = _RDEF_PROPERTIES()
+        self.assertIs(_RDEF_PROPERTIES(), rdefprops)
+        self.assertNotIn('test1', rdefprops)
+        register_base_type('Test', ('test1',))
+        self.assertIn('test1', _RDEF_PROPERTIES())
+        self.assertIn('test1', _REL_PROPERTIES())
+        unregister_base_type('Test')
+        self.assertNotIn('test1', _RDEF_PROPERTIES())
+
     def test_make_base_type_class(self):
         register_base_type('Test', ('test1', 'test2'))
         Test = make_type('Test')
@@ -0,0 +1,124 @@
+# copyright 2016 LOGILAB S.A. (Paris, FRANCE), all rights reserved.
+# contact http://www.logilab.fr/ -- mailto:contact@logilab.fr
+#
+# This file is part of yams.
+#
+# yams is free software: you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# yams is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with yams. If not, see <http://www.gnu.org/licenses/>.
+"""unit tests for module yams.snapshot"""
+
+import os
+import os.path as osp
+import sys
+import tempfile
+
+from six.moves import cPickle as pickle
+
+from logilab.common.testlib import TestCase, unittest_main
+
+from yams import ValidationError
+from yams.reader import SchemaLoader
+from yams.snapshot import dump_snapshot, load_snapshot
+
+sys.path.insert(0, osp.dirname(__file__))
+
+
+class SnapshotTC(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.schema = SchemaLoader().load([cls.datadir], 'Test')
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.pkl')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def restored(self, schema):
+        dump_snapshot(schema, self.path)
+        return load_snapshot(self.path)
+
+    def test_restore(self):
+        schema = self.schema
+        restored = self.restored(schema)
+        self.assertEqual(restored.name, 'Test')
+        self.assertEqual(restored.entities(), schema.entities())
+        self.assertEqual(restored.relations(), schema.relations())
+        for eschema in schema.entities():
+            reschema = restored.eschema(eschema)
+            self.assertIs(reschema.schema, restored)
+            self.assertEqual(reschema.subject_relations(),
+                             eschema.subject_relations())
+            self.assertEqual(reschema.object_relations(),
+                             eschema.object_relations())
+            self.assertEqual(reschema.specializes(), eschema.specializes())
+            self.assertEqual(reschema.specialized_by(), eschema.specialized_by())
+        for rschema in schema.relations():
+            rrschema = restored.rschema(rschema)
+            self.assertEqual(rrschema.subjects(), rschema.subjects())
+            self.assertEqual(rrschema.objects(), rschema.objects())
+            for (subj, obj), rdef in rschema.rdefs.items():
+                rrdef = rrschema.rdefs[(subj, obj)]
+                self.assertIs(rrdef.rtype, rrschema)
+                self.assertIs(rrdef.subject, restored.eschema(rdef.subject))
+                self.assertIs(rrdef.object, restored.eschema(rdef.object))
+                self.assertEqual(rrdef.cardinality, rdef.cardinality)
+                self.assertEqual(rrdef.permissions, rdef.permissions)
+                self.assertEqual(rrdef.constraints, rdef.constraints)
+                self.assertEqual(type(rrdef.constraints), type(rdef.constraints))
+
+    def test_rdef_attributes(self):
+        rdef = self.schema.eschema('Person').rdef('nom')
+        rdef.eid = 42
+        try:
+            for restored in (self.restored(self.schema),
+                             pickle.loads(pickle.dumps(self.schema))):
+                rrdef = restored.eschema('Person').rdef('nom')
+                self.assertEqual(rrdef.eid, 42)
+                self.assertEqual(rrdef.default, rdef.default)
+                # unset slots stay unset
+                rrdef = restored.rschema('travaille').rdef('Person', 'Societe')
+                self.assertFalse(hasattr(rrdef, 'default'))
+                self.assertFalse(hasattr(rrdef, 'eid'))
+        finally:
+            del rdef._extra['eid']
+
+    def test_validation(self):
+        restored = self.restored(self.schema)
+        eperson = restored.eschema('Person')
+        eperson.check({'nom': u'Doe', 'sexe': u'F'})
+        with self.assertRaises(ValidationError):
+            eperson.check({'nom': u'Doe', 'promo': u'bad'})
+
+    def test_modify_restored(self):
+        restored = self.restored(self.schema)
+        restored.del_entity_type('Societe')
+        self.assertNotIn('Societe', restored)
+        self.assertIn('Societe', self.schema)
+
+    def test_frozen(self):
+        self.assertTrue(self.restored(self.schema.freeze()).frozen)
+        self.schema._unfreeze()
+        self.assertFalse(self.restored(self.schema).frozen)
+
+    def test_bad_snapshot(self):
+        with open(self.path, 'wb') as stream:
+            stream.write(b'not a snapshot')
+        with self.assertRaises(ValueError):
+            load_snapshot(self.path)
+
+
+if __name__ == '__main__':
+    unittest_main()
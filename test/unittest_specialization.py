@@ -20,7 +20,8 @@
 from logilab.common.testlib import TestCase, unittest_main
 
 from yams.reader import build_schema_from_namespace
-from yams.buildobjs import EntityType, String, SubjectRelation, RelationDefinition
+from yams.buildobjs import (EntityType, String, SubjectRelation,
+                            RelationDefinition, RelationType)
 
 def build_schema():
 
@@ -110,6 +111,34 @@ class SpecializationTC(TestCase):
         subsubdivision = schema.eschema('SubSubDivision')
         self.assertEqual(subsubdivision.specialized_by(False), [])
 
+    def test_ancestors(self):
+        schema = self.schema
+        self.assertEqual(schema['SubDivision'].ancestors(), ['Division', 'Company'])
+        self.assertEqual(schema['Company'].ancestors(), [])
+        self.assertEqual(schema['SubSubDivision'].ancestors(), [])
+
+    def test_is_subtype(self):
+        schema = self.schema
+        self.assertTrue(schema.is_subtype('SubDivision', 'Company'))
+        self.assertTrue(schema.is_subtype('Division', 'Division'))
+        self.assertTrue(schema.is_subtype(schema['Student'], schema['Person']))
+        self.assertFalse(schema.is_subtype('Company', 'Division'))
+        self.assertFalse(schema.is_subtype('SubSubDivision', 'SubDivision'))
+        self.assertFalse(schema.is_subtype('Student', 'Company'))
+
+    def test_specialization_closure_invalidation(self):
+        schema = self.schema
+        company = schema['Company']
+        self.assertEqual(company.specialized_by(), ['SubCompany', 'Division',
+                                                    'SubDivision'])
+        schema.rename_entity_type('SubDivision', 'Department')
+        self.assertEqual(company.specialized_by(), ['SubCompany', 'Division',
+                                                    'Department'])
+        self.assertTrue(schema.is_subtype('Department', 'Company'))
+        schema.del_entity_type('Department')
+        self.assertEqual(company.specialized_by(), ['SubCompany', 'Division'])
+        self.assertRaises(KeyError, schema.is_subtype, 'Department', 'Company')
+
     def test_relations_infered(self):
         entities = [str(e) for e in self.schema.entities() if not e.final]
         relations = sorted([r for r in self.schema.relations() if not r.final])
@@ -211,5 +240,80 @@ class SpecializationTC(TestCase):
         self.schema.remove_infered_definitions()
         self.assertIn('works_for', self.schema)
 
+    def test_infered_relations_properties(self):
+        rdef = self.schema['works_for'].rdefs['Person', 'Company']
+        irdef = self.schema['works_for'].rdefs['Person', 'SubCompany']
+        self.assertTrue(irdef.infered)
+        self.assertIs(irdef.subject, self.schema['Person'])
+        self.assertIs(irdef.object, self.schema['SubCompany'])
+        # property values are shared...
+        self.assertIs(irdef.permissions, rdef.permissions)
+        self.assertIs(irdef.constraints, rdef.constraints)
+        self.assertEqual(irdef.cardinality, rdef.cardinality)
+        # ... until written
+        irdef.set_action_permissions('add', ('managers',))
+        self.assertEqual(irdef.permissions['add'], ('managers',))
+        self.assertEqual(rdef.permissions['add'], ('managers', 'users'))
+        rdef.set_action_permissions('delete', ())
+        self.assertEqual(irdef.permissions['delete'], ('managers', 'users'))
+
+    def infered_rdefs(self):
+        return set((rdef.subject.type, rdef.rtype.type, rdef.object.type,
+                    rdef.cardinality)
+                   for rschema in self.schema.relations()
+                   for rdef in rschema.rdefs.values() if rdef.infered)
+
+    def assertInferenceUpToDate(self):
+        infered = self.infered_rdefs()
+        self.schema.rebuild_infered_relations()
+        self.assertEqual(infered, self.infered_rdefs())
+
+    def test_incremental_add_relation_def(self):
+        self.schema.add_relation_type(RelationType('manages'))
+        self.schema.add_relation_def(
+            RelationDefinition('Person', 'manages', 'Company', cardinality='?*'))
+        rdef = self.schema['manages'].rdefs['Student', 'SubDivision']
+        self.assertTrue(rdef.infered)
+        self.assertEqual(rdef.cardinality, '?*')
+        self.assertInferenceUpToDate()
+        # more specific definition
+        self.schema.add_relation_def(
+            RelationDefinition('Person', 'manages', 'Division', cardinality='1*'))
+        self.assertEqual(
+            self.schema['manages'].rdefs['Person', 'Division'].cardinality, '1*')
+        self.assertInferenceUpToDate()
+
+    def test_incremental_add_entity_type(self):
+        edef = EntityType('SubSubCompany')
+        edef.specialized_type = 'SubCompany'
+        self.schema.add_entity_type(edef)
+        self.assertIn(self.schema['SubSubCompany'],
+                      self.schema['SubCompany'].specialized_by())
+        self.assertTrue(self.schema['works_for'].rdefs['Student', 'SubSubCompany'].infered)
+        self.assertTrue(self.schema['name'].rdefs['SubSubCompany', 'String'].infered)
+        self.assertInferenceUpToDate()
+
+    def test_incremental_del_relation_def(self):
+        self.schema.del_relation_def('Division', 'division_of', 'Company')
+        rdefs = self.schema['division_of'].rdefs
+        self.assertNotIn(('Division', 'SubCompany'), rdefs)
+        # infered from SubDivision's own definition
+        self.assertTrue(rdefs['SubDivision', 'SubCompany'].infered)
+        self.assertInferenceUpToDate()
+        # infered definitions are not infered again once deleted
+        self.schema.del_relation_def('Person', 'works_for', 'SubCompany')
+        self.assertNotIn(('Person', 'SubCompany'), self.schema['works_for'].rdefs)
+        # relation types left without definitions are removed
+        self.schema.del_relation_def('Person', 'works_for', 'Company')
+        self.schema.del_relation_def('Student', 'works_for', 'Company')
+        self.assertNotIn('works_for', self.schema)
+        self.assertNotIn('works_for', self.schema['Student'].subjrels)
+
+    def test_del_entity_type(self):
+        self.schema.del_entity_type('SubDivision')
+        self.assertNotIn('SubDivision', self.schema)
+        self.assertNotIn('SubDivision', self.schema['works_for'].objects())
+        self.assertInferenceUpToDate()
+
 if __name__ == '__main__':
     unittest_main()
@@ -129,6 +129,7 @@ def register_base_type(name, parameters=(), check_function=None):
         # turn tuple/list into dict with None values
         parameters = dict((p, None) for p in parameters)
     RelationDefinitionSchema.BASE_TYPE_PROPERTIES[name] = parameters
+    RelationDefinitionSchema._properties_version += 1
     # Add a yams checker or yes is not specified
     BASE_CHECKERS[name] = check_function or yes
 
@@ -140,4 +141,5 @@ def unregister_base_type(name):
     assert name in BASE_TYPES, '%s not in BASE_TYPES %s' % (name, BASE_TYPES)
     BASE_TYPES.remove(name)
     RelationDefinitionSchema.BASE_TYPE_PROPERTIES.pop(name)
+    RelationDefinitionSchema._properties_version += 1
     BASE_CHECKERS.pop(name)
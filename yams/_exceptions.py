@@ -44,6 +44,15 @@ class UnknownType(SchemaError):
         return self.msg % self.args
 
 
+class FrozenSchemaError(SchemaError):
+    """trying to modify a frozen schema"""
+
+    msg = "can't modify %s: the schema is frozen"
+
+    def __unicode__(self):
+        return self.msg % self.args
+
+
 class BadSchemaDefinition(SchemaError):
     """error in the schema definition
 
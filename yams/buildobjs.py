@@ -45,8 +45,20 @@ ETYPE_PROPERTIES = ('description', '__permissions__', '__unique_together__')
 # RelationType properties. Don't put description inside, handled specifically
 RTYPE_PROPERTIES = ('symmetric', 'inlined', 'fulltext_container')
 # RelationDefinition properties have to be computed dynamically since new ones
-# may be added at runtime
-def _RDEF_PROPERTIES():
+# may be added at runtime. They are cached until they change (see
+# `RelationDefinitionSchema._properties_key`) since they are needed for each
+# relation definition
+_RDEF_PROPERTIES_CACHE = {}
+
+def _rdef_properties():
+    """return a 3-uple (relation definition properties, relation type and
+    definition properties, relation definition properties but description)
+    """
+    key = RelationDefinitionSchema._properties_key()
+    try:
+        return _RDEF_PROPERTIES_CACHE[key]
+    except KeyError:
+        pass
     base = RelationDefinitionSchema.ALL_PROPERTIES()
     # infered is an internal property and should not be specified explicitly
     base.remove('infered')
@@ -54,11 +66,19 @@ def _RDEF_PROPERTIES():
     # definition files
     base.remove('permissions')
     base.add('__permissions__')
-    return tuple(base)
+    rdefprops = tuple(base)
+    base.discard('description')
+    properties = (rdefprops, RTYPE_PROPERTIES + rdefprops, tuple(base))
+    _RDEF_PROPERTIES_CACHE.clear()
+    _RDEF_PROPERTIES_CACHE[key] = properties
+    return properties
+
+def _RDEF_PROPERTIES():
+    return _rdef_properties()[0]
 # regroup all rtype/rdef properties as they may be defined one on each other in
 # some cases
 def _REL_PROPERTIES():
-    return RTYPE_PROPERTIES + _RDEF_PROPERTIES()
+    return _rdef_properties()[1]
 
 # pre 0.37 backward compat
 RDEF_PROPERTIES = () # stuff added here is also added to underlying dict, nevermind
@@ -705,10 +725,10 @@ class RelationDefinition(Definition):
     def _add_relations(self, defined, schema):
         name = getattr(self, 'name', self.__class__.__name__)
         rtype = defined[name]
-        rdefprops = _RDEF_PROPERTIES()
+        rdefprops, _, nodescrprops = _rdef_properties()
         # copy relation definition attributes set on the relation type, beside
         # description
-        _copy_attributes(rtype, self, set(rdefprops) - set(('description',)))
+        _copy_attributes(rtype, self, nodescrprops)
         # process default cardinality and constraints if not set yet
         cardinality = self.cardinality
         if cardinality is MARKER:
@@ -739,13 +759,13 @@ class RelationDefinition(Definition):
                 permissions = DEFAULT_RELPERMS
         else:
             permissions = self.__permissions__
-        for subj in _actual_types(schema, self.subject):
-            for obj in _actual_types(schema, self.object):
-                rdef = RelationDefinition(subj, name, obj,
-                                          __permissions__=permissions,
-                                          package=self.package)
-                _copy_attributes(self, rdef, rdefprops)
-                schema.add_relation_def(rdef)
+        # properties are copied once and shared by all expanded definitions
+        rdef = RelationDefinition(self.subject, name, self.object,
+                                  __permissions__=permissions,
+                                  package=self.package)
+        _copy_attributes(self, rdef, rdefprops)
+        schema.add_relation_defs(rdef, _actual_types(schema, self.subject),
+                                 _actual_types(schema, self.object))
 
 def _actual_types(schema, etype):
     if etype == '*':
@@ -760,7 +780,6 @@ def _actual_types(schema, etype):
     return (etype,)
 
 def _pow_etypes(schema):
-    for eschema in schema.entities():
-        if eschema.final:
-            continue
-        yield eschema.type
+    # computed once until entity types are added or removed, not on each
+    # expanded wildcard
+    return schema._nonfinal_etypes()
@@ -0,0 +1,180 @@
+# copyright 2016 LOGILAB S.A. (Paris, FRANCE), all rights reserved.
+# contact http://www.logilab.fr/ -- mailto:contact@logilab.fr
+#
+# This file is part of yams.
+#
+# yams is free software: you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# yams is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with yams. If not, see <http://www.gnu.org/licenses/>.
+"""Columnar validation of entities attribute values.
+
+Values are given column-wise (one sequence or numpy array per attribute) and
+checked at once using numpy vectorized operations where possible. This module
+requires numpy.
+"""
+
+__docformat__ = "restructuredtext en"
+
+import numpy
+
+from yams import constraints as cstrmod
+
+# per-row error codes
+VALID = 0
+# missing value for a required attribute
+REQUIRED = 1
+# value of incorrect type
+BAD_TYPE = 2
+# the n-th constraint of the relation definition failed: CONSTRAINT + n
+CONSTRAINT = 3
+
+
+def check_columns(eschema, columns, creation=False):
+    """check attribute values of several entities of type `eschema`, given as
+    a mapping from attribute name to a sequence or numpy array of values (one
+    item per entity).
+
+    Return a 2-uple (`mask`, `codes`) where `mask` is a boolean array telling
+    for each row whether it is valid, and `codes` a dictionary mapping
+    qualified attribute name (see :func:`yams.schema.role_name`) to an array
+    of per-row error codes (`VALID`, `REQUIRED`, `BAD_TYPE` or `CONSTRAINT` +
+    index of the failed constraint).
+
+    Semantics are those of :meth:`yams.schema.EntitySchema.check`, except that
+    values are not converted in-place. Type checks and usual constraints are
+    vectorized, others (e.g. constraints with boundaries depending on the
+    entity or on the current date) fall back to a per-row check, where the
+    current date is evaluated once (see :func:`yams.constraints.fixed_clock`).
+    """
+    with cstrmod.fixed_clock():
+        return _check_columns(eschema, columns, creation)
+
+
+def _check_columns(eschema, columns, creation):
+    arrays = {}
+    nrows = None
+    for name, values in columns.items():
+        values = cstrmod._as_array(values)
+        if nrows is None:
+            nrows = len(values)
+        elif len(values) != nrows:
+            raise ValueError('column %s has %s values, expected %s'
+                             % (name, len(values), nrows))
+        arrays[name] = values
+    if nrows is None:
+        nrows = 0
+    mask = numpy.ones(nrows, dtype=bool)
+    codes = {}
+    for (rschema, qname, required, aschema, checker, converter,
+         rdef) in eschema._validation_plan():
+        values = arrays.get(rschema.type)
+        if values is None:
+            if creation and required:
+                codes[qname] = numpy.full(nrows, REQUIRED, dtype=numpy.int16)
+                mask[:] = False
+            continue
+        code = numpy.zeros(nrows, dtype=numpy.int16)
+        codes[qname] = code
+        if values.dtype.kind == 'O':
+            isnull = numpy.fromiter((value is None for value in values),
+                                    dtype=bool, count=nrows)
+            if required:
+                code[isnull] = REQUIRED
+            pending = numpy.flatnonzero(~isnull)
+        else:
+            pending = numpy.arange(nrows)
+        # check value according to their type
+        pvalues = values[pending]
+        valid = _check_type(checker, aschema, pvalues)
+        code[pending[~valid]] = BAD_TYPE
+        pending, pvalues = pending[valid], pvalues[valid]
+        # convert values unless their kind is the one of the expected type,
+        # e.g. strings accepted as integers
+        if (converter is not None
+                and pvalues.dtype.kind not in _CHECKER_KINDS.get(checker, '')):
+            pvalues = cstrmod._as_array([converter(value) for value in pvalues])
+        # check arbitrary constraints
+        for index, constraint in enumerate(rdef.constraints):
+            if not len(pending):
+                break
+            rows = _Rows(arrays, pending)
+            if hasattr(constraint, 'check_array'):
+                valid = constraint.check_array(pvalues, rows, rschema)
+            else:
+                valid = numpy.fromiter(
+                    (bool(constraint.check(row, rschema, value))
+                     for row, value in zip(rows, pvalues)),
+                    dtype=bool, count=len(pending))
+            code[pending[~valid]] = CONSTRAINT + index
+            pending, pvalues = pending[valid], pvalues[valid]
+        mask &= code == VALID
+    return mask, codes
+
+
+class _Row(object):
+    """give access to the values of a row as an entity would, for constraints
+    which can't be vectorized
+    """
+    def __init__(self, arrays, index):
+        self._arrays = arrays
+        self._index = index
+
+    def __getitem__(self, attr):
+        return self._arrays[attr][self._index]
+
+    def __getattr__(self, attr):
+        try:
+            return self[attr]
+        except KeyError:
+            raise AttributeError(attr)
+
+
+class _Rows(object):
+    """sequence of `_Row` for rows at `indexes`, built on demand: they're not
+    needed by vectorized constraint checks
+    """
+    def __init__(self, arrays, indexes):
+        self._arrays = arrays
+        self._indexes = indexes
+
+    def __len__(self):
+        return len(self._indexes)
+
+    def __getitem__(self, index):
+        return _Row(self._arrays, self._indexes[index])
+
+    def __iter__(self):
+        for index in self._indexes:
+            yield _Row(self._arrays, index)
+
+
+# type checking ###############################################################
+
+# array kinds known to satisfy a base type checker
+_CHECKER_KINDS = {
+    cstrmod.check_string: 'U',
+    cstrmod.check_password: 'S',
+    cstrmod.check_int: 'biu',
+    cstrmod.check_float: 'biuf',
+    cstrmod.check_decimal: 'biu',
+    cstrmod.check_boolean: 'biu',
+}
+
+
+def _check_type(checker, aschema, values):
+    if checker is cstrmod.yes:
+        return numpy.ones(len(values), dtype=bool)
+    kinds = _CHECKER_KINDS.get(checker)
+    if kinds is not None and values.dtype.kind in kinds:
+        return numpy.ones(len(values), dtype=bool)
+    return numpy.fromiter((bool(checker(aschema, value)) for value in values),
+                          dtype=bool, count=len(values))
@@ -24,9 +24,13 @@ import decimal
 import operator
 import json
 import datetime
+import threading
 import warnings
+import weakref
+from contextlib import contextmanager
+from copy import copy
 
-from six import string_types, text_type, binary_type
+from six import string_types, text_type, binary_type, get_unbound_function
 
 from logilab.common.deprecation import class_renamed
 
@@ -84,13 +88,81 @@ def _message_value(boundary):
     return boundary
 
 
+# whether a constraint class overrides a method of a base class, by (class,
+# base class, method name)
+_OVERRIDES = {}
+
+
+def _overrides(cls, basecls, name):
+    try:
+        return _OVERRIDES[(cls, basecls, name)]
+    except KeyError:
+        overrides = _OVERRIDES[(cls, basecls, name)] = (
+            get_unbound_function(getattr(cls, name))
+            is not get_unbound_function(getattr(basecls, name)))
+        return overrides
+
+
+def _custom_serialize(cls):
+    """return true if constraint class `cls` overrides `serialize` instead of
+    `_serialize`
+    """
+    return _overrides(cls, BaseConstraint, 'serialize')
+
+
 class BaseConstraint(object):
-    """base class for constraints"""
+    """base class for constraints.
+
+    Constraints are compared and hashed according to their canonical key (see
+    `canonical_key`), which is cached until an attribute of the constraint is
+    set. Once frozen (see `freeze`), a constraint can't be modified anymore.
+    Notice in-place modifications of attribute values can't be detected.
+    """
     __implements__ = IConstraint
+    # attributes caching values computed from other attributes, reset when an
+    # attribute is set
+    _cache_attrs = ('_canonical_key',)
 
     def __init__(self, msg=None):
         self.msg = msg
 
+    def __setattr__(self, attr, value):
+        if self.__dict__.get('_frozen'):
+            raise AttributeError("can't set attribute %s of frozen constraint %s"
+                                 % (attr, self.type()))
+        for cacheattr in self._cache_attrs:
+            self.__dict__.pop(cacheattr, None)
+        super(BaseConstraint, self).__setattr__(attr, value)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for cacheattr in self._cache_attrs:
+            state.pop(cacheattr, None)
+        state.pop('_frozen', None)
+        return state
+
+    def freeze(self):
+        """make the constraint read-only, and return it"""
+        self.canonical_key()
+        self.__dict__['_frozen'] = True
+        return self
+
+    @property
+    def frozen(self):
+        return self.__dict__.get('_frozen', False)
+
+    def canonical_key(self):
+        """return a (type, serialized data) tuple identifying the constraint"""
+        try:
+            return self.__dict__['_canonical_key']
+        except KeyError:
+            if _custom_serialize(self.__class__):
+                data = self.serialize()
+            else:
+                data = self._serialize()
+            key = self.__dict__['_canonical_key'] = (self.type(), data)
+            return key
+
     def check_consistency(self, subjschema, objschema, rdef):
         pass
 
@@ -99,6 +171,15 @@ class BaseConstraint(object):
 
     def serialize(self):
         """called to make persistent valuable data of a constraint"""
+        if _custom_serialize(self.__class__):
+            # called by the overriding method
+            return self._serialize()
+        return self.canonical_key()[1]
+
+    def _serialize(self):
+        """return serialized data of the constraint, to be overridden instead
+        of `serialize` to benefit from the canonical key cache
+        """
         return cstr_json_dumps({u'msg': self.msg})
 
     @classmethod
@@ -127,26 +208,37 @@ class BaseConstraint(object):
             key + '-value': value}
 
     def __eq__(self, other):
+        if isinstance(other, BaseConstraint):
+            return self.canonical_key() == other.canonical_key()
         return (self.type(), self.serialize()) == (other.type(), other.serialize())
 
     def __ne__(self, other):
         return not self == other
 
     def __hash__(self):
-        return hash((self.type(), self.serialize()))
+        return hash(self.canonical_key())
 
     def __lt__(self, other):
         return NotImplemented
 
+    def check_array(self, values, entities=None, rtype=None):
+        """return a numpy boolean array telling for each item of `values` (a
+        sequence or numpy array) whether it satisfies the constraint.
 
-    def __eq__(self, other):
-        return (self.type(), self.serialize()) == (other.type(), other.serialize())
-
-    def __ne__(self, other):
-        return not self == other
+        `entities` is an optional sequence giving the entity of each value,
+        used by constraints depending on other attributes. This requires
+        numpy. Constraints of yams use numpy vectorized operations where
+        possible, this default implementation calls `check` for each value.
+        """
+        return self._check_rows(_as_array(values), entities, rtype)
 
-    def __hash__(self):
-        return hash((self.type(), self.serialize()))
+    def _check_rows(self, values, entities, rtype):
+        import numpy
+        if entities is None:
+            entities = (None,) * len(values)
+        return numpy.fromiter((bool(self.check(entity, rtype, value))
+                               for entity, value in zip(entities, values)),
+                              dtype=bool, count=len(values))
 
 
 # possible constraints ########################################################
@@ -166,6 +258,13 @@ class UniqueConstraint(BaseConstraint):
         """return true if the value satisfy the constraint, else false"""
         return True
 
+    def check_array(self, values, entities=None, rtype=None):
+        values = _as_array(values)
+        if _overrides(self.__class__, UniqueConstraint, 'check'):
+            return self._check_rows(values, entities, rtype)
+        import numpy
+        return numpy.ones(len(values), dtype=bool)
+
 
 class SizeConstraint(BaseConstraint):
     """the string size constraint :
@@ -220,6 +319,23 @@ class SizeConstraint(BaseConstraint):
                 return False
         return True
 
+    def check_array(self, values, entities=None, rtype=None):
+        values = _as_array(values)
+        if _overrides(self.__class__, SizeConstraint, 'check'):
+            return self._check_rows(values, entities, rtype)
+        import numpy
+        if values.dtype.kind in 'US':
+            lengths = numpy.char.str_len(values)
+        else:
+            lengths = numpy.fromiter((len(value) for value in values),
+                                     dtype=numpy.intp, count=len(values))
+        valid = numpy.ones(len(values), dtype=bool)
+        if self.max is not None:
+            valid &= lengths <= self.max
+        if self.min is not None:
+            valid &= lengths >= self.min
+        return valid
+
     def _failed_message(self, entity, key, value):
         if self.max is not None and len(value) > self.max:
             return _('value should have maximum size of %(KEY-max)s but found %(KEY-size)s'), {
@@ -231,7 +347,7 @@ class SizeConstraint(BaseConstraint):
                 key + '-size': len(value)}
         assert False, 'shouldnt be there'
 
-    def serialize(self):
+    def _serialize(self):
         """simple text serialization"""
         return cstr_json_dumps({u'min': self.min, u'max': self.max,
                                 u'msg': self.msg})
@@ -283,12 +399,22 @@ class RegexpConstraint(BaseConstraint):
         """return true if the value maches the regular expression"""
         return self._rgx.match(value, self.flags)
 
+    def check_array(self, values, entities=None, rtype=None):
+        values = _as_array(values)
+        if _overrides(self.__class__, RegexpConstraint, 'check'):
+            return self._check_rows(values, entities, rtype)
+        import numpy
+        match, flags = self._rgx.match, self.flags
+        return numpy.fromiter((match(value, flags) is not None
+                               for value in values),
+                              dtype=bool, count=len(values))
+
     def _failed_message(self, entity, key, value):
         return _("%(KEY-value)r doesn't match the %(KEY-regexp)r regular expression"), {
             key + '-value': value,
             key + '-regexp': self.regexp}
 
-    def serialize(self):
+    def _serialize(self):
         """simple text serialization"""
         return cstr_json_dumps({u'regexp': self.regexp, u'flags': self.flags,
                                 u'msg': self.msg})
@@ -322,6 +448,8 @@ class BoundaryConstraint(BaseConstraint):
     """
     __implements__ = IConstraint
 
+    _cache_attrs = BaseConstraint._cache_attrs + ('check',)
+
     def __init__(self, op, boundary=None, msg=None):
         super(BoundaryConstraint, self).__init__(msg)
         assert op in OPERATORS, op
@@ -338,17 +466,47 @@ class BoundaryConstraint(BaseConstraint):
 
     def check(self, entity, rtype, value):
         """return true if the value satisfies the constraint, else false"""
-        boundary = actual_value(self.boundary, entity)
+        check = self._compile_check()
+        if _overrides(self.__class__, BoundaryConstraint, 'check'):
+            # called by the overriding method
+            return check(entity, rtype, value)
+        # further calls go directly to the compiled function
+        self.__dict__['check'] = check
+        return check(entity, rtype, value)
+
+    def _compile_check(self):
+        """return a function `check(entity, rtype, value)` specialized
+        according to the boundary being static or not
+        """
+        op = OPERATORS[self.operator]
+        boundary = self.boundary
         if boundary is None:
-            return True
-        return OPERATORS[self.operator](value, boundary)
+            return _always_true
+        if not hasattr(boundary, 'value'):
+            return lambda entity, rtype, value: op(value, boundary)
+        def check(entity, rtype, value):
+            actual = boundary.value(entity)
+            return actual is None or op(value, actual)
+        return check
+
+    def check_array(self, values, entities=None, rtype=None):
+        values = _as_array(values)
+        if (_overrides(self.__class__, BoundaryConstraint, 'check')
+                or isinstance(self.boundary, Attribute)):
+            return self._check_rows(values, entities, rtype)
+        import numpy
+        boundary = actual_value(self.boundary, None)
+        if boundary is None:
+            return numpy.ones(len(values), dtype=bool)
+        return numpy.asarray(OPERATORS[self.operator](values, boundary),
+                             dtype=bool)
 
     def _failed_message(self, entity, key, value):
         return "value %%(KEY-value)s must be %s %%(KEY-boundary)s" % self.operator, {
             key + '-value': value,
             key + '-boundary': _message_value(actual_value(self.boundary, entity))}
 
-    def serialize(self):
+    def _serialize(self):
         """simple text serialization"""
         return cstr_json_dumps({u'op': self.operator, u'boundary': self.boundary,
                                 u'msg': self.msg})
@@ -381,6 +539,8 @@ class IntervalBoundConstraint(BaseConstraint):
     """
     __implements__ = IConstraint
 
+    _cache_attrs = BaseConstraint._cache_attrs + ('check',)
+
     def __init__(self, minvalue=None, maxvalue=None, msg=None):
         """
         :param minvalue: the minimal value that can be used
@@ -400,13 +560,53 @@ class IntervalBoundConstraint(BaseConstraint):
                                       "to non final entity type")
 
     def check(self, entity, rtype, value):
-        minvalue = actual_value(self.minvalue, entity)
-        if minvalue is not None and value < minvalue:
-            return False
-        maxvalue = actual_value(self.maxvalue, entity)
-        if maxvalue is not None and value > maxvalue:
-            return False
-        return True
+        check = self._compile_check()
+        if _overrides(self.__class__, IntervalBoundConstraint, 'check'):
+            # called by the overriding method
+            return check(entity, rtype, value)
+        # further calls go directly to the compiled function
+        self.__dict__['check'] = check
+        return check(entity, rtype, value)
+
+    def _compile_check(self):
+        """return a function `check(entity, rtype, value)` specialized
+        according to boundaries being static or not
+        """
+        minvalue, maxvalue = self.minvalue, self.maxvalue
+        if hasattr(minvalue, 'value') or hasattr(maxvalue, 'value'):
+            def check(entity, rtype, value):
+                actual = actual_value(minvalue, entity)
+                if actual is not None and value < actual:
+                    return False
+                actual = actual_value(maxvalue, entity)
+                return actual is None or not value > actual
+        # use the same comparisons as with dynamic boundaries, they differ
+        # for incomparable values (e.g. NaN)
+        elif minvalue is None:
+            check = lambda entity, rtype, value: not value > maxvalue
+        elif maxvalue is None:
+            check = lambda entity, rtype, value: not value < minvalue
+        else:
+            check = lambda entity, rtype, value: not (value < minvalue or value > maxvalue)
+        return check
+
+    def check_array(self, values, entities=None, rtype=None):
+        values = _as_array(values)
+        if (_overrides(self.__class__, IntervalBoundConstraint, 'check')
+                or isinstance(self.minvalue, Attribute)
+                or isinstance(self.maxvalue, Attribute)):
+            return self._check_rows(values, entities, rtype)
+        import numpy
+        valid = numpy.ones(len(values), dtype=bool)
+        # NOW and TODAY boundaries don't depend on the entity
+        with fixed_clock():
+            minvalue = actual_value(self.minvalue, None)
+            maxvalue = actual_value(self.maxvalue, None)
+        if minvalue is not None:
+            valid &= ~numpy.asarray(values < minvalue, dtype=bool)
+        if maxvalue is not None:
+            valid &= ~numpy.asarray(values > maxvalue, dtype=bool)
+        return valid
 
     def _failed_message(self, entity, key, value):
         if self.minvalue is not None and value < actual_value(self.minvalue, entity):
@@ -419,7 +619,7 @@ class IntervalBoundConstraint(BaseConstraint):
                 key + '-boundary': _message_value(self.maxvalue)}
         assert False, 'shouldnt be there'
 
-    def serialize(self):
+    def _serialize(self):
         """simple text serialization"""
         return cstr_json_dumps({u'minvalue': self.minvalue, u'maxvalue': self.maxvalue,
                                 u'msg': self.msg})
@@ -438,6 +638,7 @@ class IntervalBoundConstraint(BaseConstraint):
 class StaticVocabularyConstraint(BaseConstraint):
     """Enforces a predefined vocabulary set for the value."""
     __implements__ = IVocabularyConstraint
+    _cache_attrs = BaseConstraint._cache_attrs + ('_values_set',)
 
     def __init__(self, values, msg=None):
         super(StaticVocabularyConstraint, self).__init__(msg)
@@ -448,7 +649,45 @@ class StaticVocabularyConstraint(BaseConstraint):
 
     def check(self, entity, rtype, value):
         """return true if the value is in the specific vocabulary"""
-        return value in self.vocabulary(entity=entity)
+        if self._dynamic_vocabulary():
+            return value in self.vocabulary(entity=entity)
+        return self._in_values(value)
+
+    def check_array(self, values, entities=None, rtype=None):
+        values = _as_array(values)
+        if (_overrides(self.__class__, StaticVocabularyConstraint, 'check')
+                or self._dynamic_vocabulary()):
+            return self._check_rows(values, entities, rtype)
+        import numpy
+        if values.dtype.kind != 'O':
+            vocabulary = numpy.asarray(self.values)
+            if vocabulary.dtype.kind != 'O':
+                return numpy.isin(values, vocabulary)
+        in_values = self._in_values
+        return numpy.fromiter((in_values(value) for value in values),
+                              dtype=bool, count=len(values))
+
+    def _dynamic_vocabulary(self):
+        return _overrides(self.__class__, StaticVocabularyConstraint, 'vocabulary')
+
+    def _in_values(self, value):
+        """return true if `value` is one of `values`, using a set built on
+        first call unless some values aren't hashable
+        """
+        try:
+            values = self.__dict__['_values_set']
+        except KeyError:
+            try:
+                values = frozenset(self.values)
+            except TypeError:
+                values = None
+            self.__dict__['_values_set'] = values
+        if values is not None:
+            try:
+                return value in values
+            except TypeError:
+                pass
+        return value in self.values
 
     def _failed_message(self, entity, key, value):
         if isinstance(value, string_types):
@@ -464,7 +703,7 @@ class StaticVocabularyConstraint(BaseConstraint):
         """return a list of possible values for the attribute"""
         return self.values
 
-    def serialize(self):
+    def _serialize(self):
         """serialize possible values as a json object"""
         return cstr_json_dumps({u'values': self.values, u'msg': self.msg})
 
@@ -509,12 +748,91 @@ class MultipleStaticVocabularyConstraint(StaticVocabularyConstraint):
     # XXX never used
     def check(self, entity, rtype, values):
         """return true if the values satisfy the constraint, else false"""
-        vocab = self.vocabulary(entity=entity)
+        if self._dynamic_vocabulary():
+            vocab = self.vocabulary(entity=entity)
+            for value in values:
+                if value not in vocab:
+                    return False
+            return True
         for value in values:
-            if value not in vocab:
+            if not self._in_values(value):
                 return False
         return True
 
+    def check_array(self, values, entities=None, rtype=None):
+        # values are sequences
+        return self._check_rows(_as_array(values), entities, rtype)
+
+
+# interned constraints by (class, canonical key), see `intern_constraint`
+_INTERNED = weakref.WeakValueDictionary()
+# whether constraints of a class may be interned, by class
+_INTERNABLE = {}
+
+
+def _internable(cls):
+    """return true if the serialized form of constraints of class `cls` holds
+    all their parameters: built-in constraints and classes defining their own
+    serialization. Other classes may take parameters which aren't serialized,
+    so equal canonical keys don't mean equal constraints.
+    """
+    try:
+        return _INTERNABLE[cls]
+    except KeyError:
+        internable = _INTERNABLE[cls] = (
+            cls.__module__ == __name__
+            or 'serialize' in cls.__dict__ or '_serialize' in cls.__dict__)
+        return internable
+
+
+def intern_constraint(cstr):
+    """return the interned constraint equal to `cstr`, a frozen copy of which
+    is interned if there is none yet (`cstr` itself is left unchanged).
+
+    Constraints which can't be serialized, whose serialization may not hold
+    all their parameters (see `_internable`), or not inheriting from
+    `BaseConstraint`, are returned as is.
+    """
+    if not (isinstance(cstr, BaseConstraint) and _internable(cstr.__class__)):
+        return cstr
+    try:
+        key = (cstr.__class__, cstr.canonical_key())
+    except (TypeError, ValueError):
+        return cstr
+    interned = _INTERNED.get(key)
+    if interned is None:
+        interned = _INTERNED.setdefault(key, copy(cstr).freeze())
+    return interned
+
+
+def intern_constraints(constraints):
+    """return a new sequence of the same type as `constraints` (list or
+    tuple) holding their interned constraints
+    """
+    return type(constraints)(intern_constraint(cstr) for cstr in constraints)
+
+
+def _always_true(entity, rtype, value):
+    return True
+
+
+def _as_array(values):
+    """return `values` as a one dimension numpy array. Items of sequences
+    which aren't arrays are kept as is in an array of objects: numpy won't
+    convert values of heterogeneous types.
+    """
+    import numpy
+    if isinstance(values, numpy.ndarray):
+        if values.ndim != 1:
+            raise ValueError('expected one dimension array, got %s'
+                             % values.ndim)
+        return values
+    values = list(values)
+    array = numpy.empty(len(values), dtype=object)
+    for index, value in enumerate(values):
+        array[index] = value
+    return array
+
 
 # special classes to be used w/ constraints accepting values as argument(s):
 # IntervalBoundConstraint
@@ -525,6 +843,37 @@ def actual_value(value, entity):
     return value
 
 
+# current date and time by (type, keyword) while in a `fixed_clock` block
+_clock = threading.local()
+
+
+@contextmanager
+def fixed_clock():
+    """context manager within which `NOW` and `TODAY` boundaries evaluate the
+    current date / time only once, e.g. so that a batch of entities is
+    validated against the same clock at a lower cost
+    """
+    if getattr(_clock, 'values', None) is not None:
+        yield
+        return
+    _clock.values = {}
+    try:
+        yield
+    finally:
+        _clock.values = None
+
+
+def _current(etype, keyword):
+    values = getattr(_clock, 'values', None)
+    if values is None:
+        return yams.KEYWORD_MAP[etype][keyword]()
+    try:
+        return values[(etype, keyword)]
+    except KeyError:
+        value = values[(etype, keyword)] = yams.KEYWORD_MAP[etype][keyword]()
+        return value
+
+
 class Attribute(object):
     def __init__(self, attr):
         self.attr = attr
@@ -544,7 +893,7 @@ class NOW(object):
         return '%s(%r)' % (self.__class__.__name__, self.offset)
 
     def value(self, entity):
-        now = yams.KEYWORD_MAP['Datetime']['NOW']()
+        now = _current('Datetime', 'NOW')
         if self.offset:
             now += self.offset
         return now
@@ -559,7 +908,7 @@ class TODAY(object):
         return '%s(%r, %r)' % (self.__class__.__name__, self.offset, self.type)
 
     def value(self, entity):
-        now = yams.KEYWORD_MAP[self.type]['TODAY']()
+        now = _current(self.type, 'TODAY')
         if self.offset:
             now += self.offset
         return now
@@ -0,0 +1,112 @@
+# copyright 2016 LOGILAB S.A. (Paris, FRANCE), all rights reserved.
+# contact http://www.logilab.fr/ -- mailto:contact@logilab.fr
+#
+# This file is part of yams.
+#
+# yams is free software: you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# yams is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with yams. If not, see <http://www.gnu.org/licenses/>.
+"""Profiling of the schema building process.
+
+A :class:`BuildProfile` given to :func:`yams.reader.fill_schema` (or created by
+:meth:`yams.reader.SchemaLoader.load` when called with `profile=True`) records
+wall time and number of calls of each building phase.
+"""
+
+__docformat__ = "restructuredtext en"
+
+from collections import namedtuple
+from contextlib import contextmanager
+from timeit import default_timer
+
+# statistics of a building phase, `time` in seconds
+PhaseStats = namedtuple('PhaseStats', 'name calls time')
+
+
+class BuildProfile(object):
+    """wall time and number of calls of schema building phases, in the order
+    they have been first entered
+    """
+
+    def __init__(self):
+        self._phases = {}
+        self._order = []
+
+    @contextmanager
+    def phase(self, name):
+        """context manager recording time spent in its block for phase `name`
+        """
+        start = default_timer()
+        try:
+            yield
+        finally:
+            self.add(name, default_timer() - start)
+
+    def add(self, name, duration, calls=1):
+        """account `calls` calls and `duration` seconds to phase `name`"""
+        try:
+            stats = self._phases[name]
+        except KeyError:
+            self._order.append(name)
+            stats = self._phases[name] = [0, 0.]
+        stats[0] += calls
+        stats[1] += duration
+
+    def __getitem__(self, name):
+        calls, duration = self._phases[name]
+        return PhaseStats(name, calls, duration)
+
+    def __contains__(self, name):
+        return name in self._phases
+
+    def report(self):
+        """return the list of `PhaseStats` of recorded phases"""
+        return [self[name] for name in self._order]
+
+    @property
+    def total(self):
+        """total time spent in recorded phases, in seconds"""
+        return sum(duration for calls, duration in self._phases.values())
+
+    def as_dict(self):
+        """return recorded statistics as a JSON serializable dictionary"""
+        return {'total': self.total,
+                'phases': [stats._asdict() for stats in self.report()]}
+
+    def format(self):
+        """return recorded statistics as a human readable table, slowest
+        phases first
+        """
+        total = self.total or 1.
+        report = sorted(self.report(), key=lambda stats: -stats.time)
+        width = max([len(stats.name) for stats in report] + [5])
+        lines = ['%-*s %8s %10s %6s' % (width, 'phase', 'calls', 'time (s)', '%')]
+        for stats in report:
+            lines.append('%-*s %8d %10.4f %6.1f' % (
+                width, stats.name, stats.calls, stats.time,
+                100 * stats.time / total))
+        lines.append('%-*s %8s %10.4f' % (width, 'total', '', self.total))
+        return '\n'.join(lines)
+
+
+@contextmanager
+def _nophase():
+    yield
+
+
+def phase(profile, name):
+    """return a context manager recording time of phase `name` in `profile`,
+    or doing nothing if `profile` is None
+    """
+    if profile is None:
+        return _nophase()
+    return profile.phase(name)
@@ -26,19 +26,49 @@ __docformat__ = "restructuredtext en"
 
 import sys
 import os
+import errno
 import types
 import pkgutil
+import hashlib
+import marshal
+import struct
+from multiprocessing import Pool
+try:
+    from importlib.util import MAGIC_NUMBER
+except ImportError: # python < 3.4
+    from imp import get_magic
+    MAGIC_NUMBER = get_magic()
+from binascii import hexlify
 from os import listdir
 from os.path import (dirname, exists, join, splitext, basename, abspath,
                      realpath)
+from timeit import default_timer
 from warnings import warn
 
+from six import text_type
+from six.moves import cPickle as pickle
+
 from logilab.common import tempattr
 from logilab.common.modutils import modpath_from_file, cleanup_sys_modules, clean_sys_modules
 
+import yams
 from yams import UnknownType, BadSchemaDefinition, BASE_TYPES
 from yams import constraints, schema as schemamod
 from yams import buildobjs
+from yams.snapshot import dump_snapshot, load_snapshot
+from yams.profiling import BuildProfile, phase
+
+try:
+    from os import fsencode
+except ImportError: # python < 3.2
+    def fsencode(path):
+        if isinstance(path, text_type):
+            return path.encode(sys.getfilesystemencoding() or 'utf-8')
+        return path
+
+# schema cache usage statistics, see `cache_dir` argument of
+# :meth:`SchemaLoader.load`
+CACHE_STATS = {'hits': 0, 'misses': 0}
 
 
 CONSTRAINTS = {}
@@ -56,40 +86,71 @@ for objname in dir(constraints):
 
 
 def fill_schema(schema, erdefs, register_base_types=True,
-                remove_unused_rtypes=False, post_build_callbacks=[]):
+                remove_unused_rtypes=False, post_build_callbacks=[],
+                lazy=False, profile=None):
+    """fill `schema` with definitions in `erdefs`
+
+    If `lazy` is true, relation definitions are only added to the schema on
+    first access to relation or entity schemas they involve (see
+    :meth:`yams.schema.Schema.defer_relation_definitions`).
+
+    If `profile` is given, it should be a :class:`yams.profiling.BuildProfile`
+    where time spent in each building phase is recorded.
+    """
     if register_base_types:
-        buildobjs.register_base_types(schema)
+        with phase(profile, 'register_base_types'):
+            buildobjs.register_base_types(schema)
     # relation definitions may appear multiple times
     erdefs_vals = set(erdefs.values())
     # register relation types and non final entity types
-    for definition in erdefs_vals:
-        if isinstance(definition, type):
-            definition = definition()
-        if isinstance(definition, buildobjs.RelationType):
-            schema.add_relation_type(definition)
-        elif isinstance(definition, buildobjs.EntityType):
-            schema.add_entity_type(definition)
+    with phase(profile, 'add types'):
+        for definition in erdefs_vals:
+            if isinstance(definition, type):
+                definition = definition()
+            if isinstance(definition, buildobjs.RelationType):
+                schema.add_relation_type(definition)
+            elif isinstance(definition, buildobjs.EntityType):
+                schema.add_entity_type(definition)
     # register relation definitions
-    for definition in erdefs_vals:
-        if isinstance(definition, type):
-            definition = definition()
-        definition.expand_relation_definitions(erdefs, schema)
+    if lazy:
+        schema.defer_relation_definitions()
+    start = default_timer()
+    # check consistency once per relation type
+    with schema.bulk_build():
+        for definition in erdefs_vals:
+            if isinstance(definition, type):
+                definition = definition()
+            definition.expand_relation_definitions(erdefs, schema)
+    if profile is not None:
+        profile.add('expand_relation_definitions', default_timer() - start,
+                    len(erdefs_vals))
+    if lazy:
+        # relation schemas and unique together consistency are checked once
+        # relation definitions are added
+        with phase(profile, 'check_permission_definitions'):
+            for eschema in schema.entities():
+                eschema.check_permission_definitions()
+        schema.defer_relation_definitions(False)
     # call 'post_build_callback' functions found in schema modules
     for cb in post_build_callbacks:
-        cb(schema)
+        with phase(profile, 'post_build_callback %s' % cb.__module__):
+            cb(schema)
     # finalize schema
-    schema.finalize()
-    # check permissions are valid on entities and relations
-    for erschema in schema.entities() + schema.relations():
-        erschema.check_permission_definitions()
-    # check unique together consistency
-    for eschema in schema.entities():
-        eschema.check_unique_together()
+    with phase(profile, 'finalize'):
+        schema.finalize()
+    if not lazy:
+        # check permissions are valid on entities and relations
+        with phase(profile, 'check_permission_definitions'):
+            for erschema in schema.entities() + schema.relations():
+                erschema.check_permission_definitions()
+        # check unique together consistency
+        with phase(profile, 'check_unique_together'):
+            for eschema in schema.entities():
+                eschema.check_unique_together()
     # optionaly remove relation types without definitions
     if remove_unused_rtypes:
-        for rschema in schema.relations():
-            if not rschema.rdefs:
-                schema.del_relation_type(rschema)
+        with phase(profile, 'remove_unused_relation_types'):
+            schema.remove_unused_relation_types()
     return schema
 
 
@@ -99,26 +160,80 @@ class SchemaLoader(object):
     """
     schemacls = schemamod.Schema
     extrapath = None
+    # directory where code objects of schema files are cached, see `exec_file`
+    bytecode_cache_dir = None
+    # `yams.profiling.BuildProfile` of the last `load` call, if asked for
+    profile = None
     context = dict([(attr, getattr(buildobjs, attr))
                     for attr in buildobjs.__all__])
     context.update(CONSTRAINTS)
 
     def load(self, modnames, name=None,
              register_base_types=True, construction_mode='strict',
-             remove_unused_rtypes=True):
+             remove_unused_rtypes=True, cache_dir=None,
+             compile_processes=None, lazy=False, profile=False):
         """return a schema from the schema definition read from <modnames> (a
         list of (PACKAGE, modname))
+
+        If `cache_dir` is given, the built schema is stored in this directory
+        along with a fingerprint of the loading inputs (schema files content,
+        yams version, base types and loading arguments) and later reused
+        without executing schema files while the fingerprint is unchanged. The
+        `cache_hit` attribute of the loader tells whether the schema has been
+        taken from the cache, while `CACHE_STATS` counts hits and misses.
+        Notice only files listed by `modnames` are considered: modules they
+        import aren't part of the fingerprint. Also, schema files aren't
+        executed on a cache hit, so the `defined` and `post_build_callbacks`
+        attributes of the loader are left empty: subclasses using them after
+        loading shouldn't give a `cache_dir`.
+
+        If `compile_processes` is greater than 1, schema files are compiled
+        beforehand by this number of processes. They are still executed one
+        after the other, in the usual order.
+
+        If `lazy` is true, relation definitions are only added to the schema
+        on first access to relation or entity schemas they involve, see
+        :func:`fill_schema`. Since cached schemas are stored complete, it
+        doesn't make sense along with `cache_dir`.
+
+        If `profile` is true, wall time and number of calls of each loading
+        phase are recorded in a :class:`yams.profiling.BuildProfile` available
+        as the `profile` attribute of the loader.
         """
         self.defined = {}
         self.loaded_files = []
         self.post_build_callbacks = []
+        self.cache_hit = False
+        self._compiled = {}
+        self.profile = profile = BuildProfile() if profile else None
         sys.modules[__name__].context = self
         # ensure we don't have an iterator
         modnames = tuple(modnames)
         # legacy usage using a directory list
         is_directories = modnames and not isinstance(modnames[0],
                                                      (list, tuple))
+        if cache_dir is not None:
+            with phase(profile, 'load cache'):
+                cachefile = join(cache_dir, 'schema-%s.pickle' % self.fingerprint(
+                    modnames, name, register_base_types, construction_mode,
+                    remove_unused_rtypes))
+                schema = None
+                if exists(cachefile):
+                    try:
+                        schema = load_snapshot(cachefile, self.schemacls)
+                    except ValueError as ex:
+                        warn('ignoring invalid schema cache: %s' % ex)
+            if schema is not None:
+                CACHE_STATS['hits'] += 1
+                self.cache_hit = True
+                self.loaded_files = schema.loaded_files
+                return schema
+            CACHE_STATS['misses'] += 1
         try:
+            if compile_processes is not None and compile_processes > 1:
+                with phase(profile, 'compile files'):
+                    self._compile_files(self.schema_files(modnames),
+                                        compile_processes)
             if is_directories:
                 warn('provide a list of modules names instead of directories',
                      DeprecationWarning)
@@ -129,7 +244,8 @@ class SchemaLoader(object):
             try:
                 fill_schema(schema, self.defined, register_base_types,
                             remove_unused_rtypes=remove_unused_rtypes,
-                            post_build_callbacks=self.post_build_callbacks)
+                            post_build_callbacks=self.post_build_callbacks,
+                            lazy=lazy, profile=profile)
             except Exception as ex:
                 if not hasattr(ex, 'schema_files'):
                     ex.schema_files = self.loaded_files
@@ -145,9 +261,116 @@ class SchemaLoader(object):
                 cleanup_sys_modules(directories)
             else:
                 clean_sys_modules([mname for _, mname in modnames])
+            self._compiled = {}
         schema.loaded_files = self.loaded_files
+        if cache_dir is not None:
+            with phase(profile, 'store cache'):
+                try:
+                    self._store_cache(schema, cachefile)
+                except (EnvironmentError, pickle.PicklingError, TypeError,
+                        AttributeError) as ex:
+                    # e.g. unwritable cache directory or unpicklable default
+                    # value, the schema is still fine
+                    warn('unable to store schema cache %s: %s' % (cachefile, ex))
         return schema
 
+    def fingerprint(self, modnames, *args):
+        """return a fingerprint of the inputs of loading schema files in
+        `modnames` with `args` as additional :meth:`load` arguments
+        """
+        md5 = hashlib.md5()
+        def update(value):
+            md5.update(repr(value).encode('utf-8'))
+            md5.update(b'\0')
+        update((yams.__version__, sorted(BASE_TYPES), args,
+                self.__class__.__module__, self.__class__.__name__,
+                self.schemacls.__module__, self.schemacls.__name__))
+        for filepath in self.schema_files(modnames):
+            update(filepath)
+            with open(filepath, 'rb') as stream:
+                md5.update(stream.read())
+        return md5.hexdigest()
+
+    def schema_files(self, modnames):
+        """return the list of files that would be loaded for `modnames` (see
+        :meth:`load`)
+        """
+        modnames = tuple(modnames)
+        if modnames and not isinstance(modnames[0], (list, tuple)):
+            return [filepath for directory in modnames
+                    for filepath in self.get_schema_files(directory)]
+        return [filepath for _, modname, filepath in self._modnames_files(modnames)]
+
+    def _compile_files(self, filepaths, processes):
+        """compile `filepaths` in a pool of `processes` processes, keeping code
+        objects for `exec_file`
+        """
+        tocompile = []
+        for filepath in filepaths:
+            if filepath in self._compiled:
+                continue
+            code = self._cached_code(filepath)
+            if code is None:
+                tocompile.append(filepath)
+            else:
+                self._compiled[filepath] = code
+        if not tocompile:
+            return
+        pool = Pool(min(processes, len(tocompile)))
+        try:
+            results = pool.map(_compile_file, tocompile)
+        finally:
+            pool.close()
+            pool.join()
+        for filepath, code in zip(tocompile, results):
+            # files which failed to compile are compiled again by exec_file so
+            # that errors are reported as usual
+            if code is not None:
+                code = marshal.loads(code)
+                self._cache_code(filepath, code)
+                self._compiled[filepath] = code
+
+    def _store_cache(self, schema, cachefile):
+        _atomic_write(cachefile, lambda path: dump_snapshot(schema, path))
+
+    def _bytecode_file(self, filepath):
+        """return the path of the file where the code object of `filepath` is
+        cached, and the header expected at the beginning of this file
+        """
+        stat = os.stat(filepath)
+        header = MAGIC_NUMBER + struct.pack('<dQ', stat.st_mtime, stat.st_size)
+        name = hashlib.md5(fsencode(filepath)).hexdigest()
+        return join(self.bytecode_cache_dir, name + '.pyc'), header
+
+    def _cached_code(self, filepath):
+        """return the cached code object of `filepath` if the cache is enabled
+        and up to date, else None
+        """
+        if self.bytecode_cache_dir is None:
+            return None
+        cachefile, header = self._bytecode_file(filepath)
+        try:
+            with open(cachefile, 'rb') as stream:
+                if stream.read(len(header)) != header:
+                    return None
+                return marshal.load(stream)
+        except (EnvironmentError, EOFError, ValueError, TypeError):
+            return None
+
+    def _cache_code(self, filepath, code):
+        if self.bytecode_cache_dir is None:
+            return
+        cachefile, header = self._bytecode_file(filepath)
+        def write(path):
+            with open(path, 'wb') as stream:
+                stream.write(header)
+                marshal.dump(code, stream)
+        try:
+            _atomic_write(cachefile, write)
+        except EnvironmentError:
+            # as python does, silently ignore unwritable cache
+            pass
+
     def _load_definition_files(self, directories):
         for directory in directories:
             package = basename(directory)
@@ -156,6 +379,11 @@ class SchemaLoader(object):
                     self.handle_file(filepath, None)
 
     def _load_modnames(self, modnames):
+        for package, modname, filepath in self._modnames_files(modnames):
+            with tempattr(buildobjs, 'PACKAGE', package):
+                self.handle_file(filepath, modname=modname)
+
+    def _modnames_files(self, modnames):
         for package, modname in modnames:
             loader = pkgutil.find_loader(modname)
             filepath = loader.get_filename()
@@ -165,8 +393,7 @@ class SchemaLoader(object):
                 filepath = filepath[:-1]
                 if not exists(filepath):
                     continue
-            with tempattr(buildobjs, 'PACKAGE', package):
-                self.handle_file(filepath, modname=modname)
+            yield package, modname, filepath
 
     # has to be overridable sometimes (usually for test purpose)
     main_schema_directory = 'schema'
@@ -198,7 +425,11 @@ class SchemaLoader(object):
         """
         assert filepath.endswith('.py'), 'not a python file'
         if filepath not in self.loaded_files:
+            start = default_timer()
             modname, module = self.exec_file(filepath, modname)
+            if self.profile is not None:
+                self.profile.add('exec_file %s' % modname,
+                                 default_timer() - start)
             objects_to_add = set()
             for name, obj in vars(module).items():
                 if (isinstance(obj, type)
@@ -206,8 +437,12 @@ class SchemaLoader(object):
                     and obj.__module__ == modname
                     and not name.startswith('_')):
                     objects_to_add.add(obj)
+            start = default_timer()
             for obj in objects_to_add:
                 self.add_definition(obj, filepath)
+            if self.profile is not None:
+                self.profile.add('expand_type_definitions',
+                                 default_timer() - start, len(objects_to_add))
             if hasattr(module, 'post_build_callback'):
                 self.post_build_callbacks.append(module.post_build_callback)
             self.loaded_files.append(filepath)
@@ -251,13 +486,18 @@ class SchemaLoader(object):
             package = '.'.join(modname.split('.')[:-1])
             if package and not package in sys.modules:
                 __import__(package)
-            with open(filepath) as f:
-                try:
-                    code = compile(f.read(), filepath, 'exec')
-                    exec(code, fglobals)
-                except:
-                    print('exception while reading %s' % filepath, file=sys.stderr)
-                    raise
+            code = getattr(self, '_compiled', {}).pop(filepath, None)
+            try:
+                if code is None:
+                    code = self._cached_code(filepath)
+                if code is None:
+                    with open(filepath) as f:
+                        code = compile(f.read(), filepath, 'exec')
+                    self._cache_code(filepath, code)
+                exec(code, fglobals)
+            except:
+                print('exception while reading %s' % filepath, file=sys.stderr)
+                raise
             fglobals['__file__'] = filepath
             module = types.ModuleType(str(modname))
             module.__dict__.update(fglobals)
@@ -270,6 +510,55 @@ class SchemaLoader(object):
                 module.__path__ = [dirname(filepath)]
         return (modname, module)
 
+def _atomic_write(path, write):
+    """call `write` with the path of a temporary file then move this file to
+    `path`, so that concurrent readers never see a partially written file
+    """
+    directory = dirname(path)
+    if not exists(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            # may have been created concurrently
+            if not exists(directory):
+                raise
+    tmpfile = _create_temporary_file(directory)
+    try:
+        write(tmpfile)
+        os.rename(tmpfile, path)
+    except BaseException:
+        os.remove(tmpfile)
+        raise
+
+
+def _create_temporary_file(directory):
+    """create a new empty file in `directory` and return its path. Unlike
+    `tempfile.mkstemp`, which makes files only readable by their owner, its
+    mode is given by the umask as for regular files.
+    """
+    while True:
+        tmpfile = join(directory, '%s.tmp' % hexlify(os.urandom(8)).decode('ascii'))
+        try:
+            fd = os.open(tmpfile, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+        except OSError as ex:
+            if ex.errno != errno.EEXIST:
+                raise
+            continue
+        os.close(fd)
+        return tmpfile
+
+
+def _compile_file(filepath):
+    """return the marshalled code object of the python file at `filepath`, or
+    None if it can't be compiled. Run in worker processes of
+    :meth:`SchemaLoader._compile_files`.
+    """
+    try:
+        with open(filepath) as f:
+            return marshal.dumps(compile(f.read(), filepath, 'exec'))
+    except Exception:
+        return None
+
 # XXX backward compatibility to prevent changing cw.schema and cw.test.unittest_schema (3.12.+)
 PyFileReader = SchemaLoader
 PyFileReader.__init__ = lambda *x: None
@@ -20,11 +20,13 @@
 __docformat__ = "restructuredtext en"
 
 import warnings
-from copy import deepcopy
+from contextlib import contextmanager
+from copy import copy, deepcopy
 from decimal import Decimal
 from itertools import chain
 
-from six import text_type, binary_type
+from six import text_type, binary_type, get_unbound_function
+from six.moves import copyreg
 
 from logilab.common import attrdict
 from logilab.common.decorators import cached, clear_cache
@@ -32,11 +34,12 @@ from logilab.common.interface import implements
 
 import yams
 from yams import (BASE_TYPES, MARKER, ValidationError, BadSchemaDefinition,
-                  KNOWN_METAATTRIBUTES, convert_default_value, DEFAULT_ATTRPERMS,
+                  FrozenSchemaError, KNOWN_METAATTRIBUTES, convert_default_value, DEFAULT_ATTRPERMS,
                   DEFAULT_COMPUTED_RELPERMS)
 from yams.interfaces import (ISchema, IRelationSchema, IEntitySchema,
                              IVocabularyConstraint)
-from yams.constraints import BASE_CHECKERS, BASE_CONVERTERS, UniqueConstraint
+from yams.constraints import (BASE_CHECKERS, BASE_CONVERTERS, UniqueConstraint,
+                              fixed_clock, intern_constraints)
 
 _ = text_type
 
@@ -82,9 +85,28 @@ def _format_properties(props):
     res = [('%s=%s' % item) for item in props.items() if item[1]]
     return ','.join(res)
 
+object_setattr = object.__setattr__
+
+
+def _rdef_lookup(rschema, subjschema, objschema):
+    """return a relation definition of `rschema`, used when unpickling"""
+    return rschema.rdefs[(subjschema, objschema)]
+
+
+def _frozen_constraint(cstr):
+    """return `cstr` if it's frozen, else a frozen copy of it: constraints
+    which can't be interned may still be shared with definitions or other
+    schemas
+    """
+    if hasattr(cstr, 'freeze') and not cstr.frozen:
+        return copy(cstr).freeze()
+    return cstr
+
+
 class ERSchema(object):
     """Base class shared by entity and relation schema."""
-
+    # attributes holding computation results, which are not part of the state
+    _cache_attrs = ()
 
     def __init__(self, schema=None, erdef=None):
         """
@@ -117,12 +139,38 @@ class ERSchema(object):
             pass
         return hash(id(self))
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for attr in self._cache_attrs:
+            state.pop(attr, None)
+        return state
+
+    def _changed(self):
+        """to be called before any modification, see :meth:`Schema._changed`"""
+        self.schema._changed()
+
+    def _reduced_state(self):
+        """return the state to pickle or deep copy: only the schema if it's
+        holding this object, since the object is then restored along with it
+        (see `Schema.__reduce__`)
+        """
+        if (self.schema is not None
+                and getattr(self.schema, self._registry).get(self.type) is self):
+            return {'schema': self.schema}
+        return self.__getstate__()
+
+    def __reduce__(self):
+        return (copyreg.__newobj__, (self.__class__,), self._reduced_state())
+
+    def __copy__(self):
+        clone = self.__class__.__new__(self.__class__)
+        clone.__dict__.update(self.__getstate__())
+        return clone
+
     def __deepcopy__(self, memo):
-        clone = self.__class__()
+        clone = self.__class__.__new__(self.__class__)
         memo[id(self)] = clone
-        clone.type = deepcopy(self.type, memo)
-        clone.schema = deepcopy(self.schema, memo)
-        clone.__dict__ = deepcopy(self.__dict__, memo)
+        clone.__dict__.update(deepcopy(self._reduced_state(), memo))
         return clone
 
     def __str__(self):
@@ -131,6 +179,8 @@ class ERSchema(object):
 
 class PermissionMixIn(object):
     """mixin class for permissions handling"""
+    __slots__ = ()
+
     def action_permissions(self, action):
         return self.permissions[action]
 
@@ -138,7 +188,12 @@ class PermissionMixIn(object):
         assert type(permissions) is tuple, (
             'permissions is expected to be a tuple not %s' % type(permissions))
         assert action in self.ACTIONS, ('%s not in %s' % (action, self.ACTIONS))
-        self.permissions[action] = permissions
+        self._changed()
+        # permissions dictionaries may be shared, e.g. by relation definitions
+        # infered from the same definition: copy on write
+        newpermissions = self.permissions.copy()
+        newpermissions[action] = permissions
+        self.permissions = newpermissions
 
     def check_permission_definitions(self):
         """check permissions are correctly defined"""
@@ -174,6 +229,14 @@ class EntitySchema(PermissionMixIn, ERSchema):
     # they may be missing from schemas obtained by pyro
     _specialized_type = None
     _specialized_by = []
+    # precomputed navigation results, only set on frozen schemas
+    _frozen_subjrels = None
+    _frozen_objrels = None
+    _frozen_rdefs = None
+    _cache_attrs = ('_validator', '_rdef_index', '_ordered_relations_cache_',
+                    '_meta_attributes_cache_', '_frozen_subjrels',
+                    '_frozen_objrels', '_frozen_rdefs')
+    _registry = '_entities'
 
     def __init__(self, schema=None, rdef=None, *args, **kwargs):
         super(EntitySchema, self).__init__(schema, rdef, *args, **kwargs)
@@ -186,7 +249,7 @@ class EntitySchema(PermissionMixIn, ERSchema):
             self.final = self.type in BASE_TYPES
             self.permissions = rdef.__permissions__.copy()
             self._unique_together = getattr(rdef, '__unique_together__', [])
-        else: # this happens during deep copy (cf. ERSchema.__deepcopy__)
+        else: # built without definition
             self._specialized_type = None
             self._specialized_by = []
 
@@ -206,6 +269,15 @@ class EntitySchema(PermissionMixIn, ERSchema):
             msg = 'invalid __unique_together__ specification for %s: %s' % (self, ', '.join(errors))
             raise BadSchemaDefinition(msg)
 
+    def __getattr__(self, attr):
+        # relations of entity types of a lazily built schema are only set once
+        # pending relation definitions involving them have been added, see
+        # `Schema.defer_relation_definitions`
+        if attr in ('subjrels', 'objrels') and '_pending_rels' in self.__dict__:
+            self.schema._materialize_entity(self)
+            return self.__dict__[attr]
+        raise AttributeError(attr)
+
     def __repr__(self):
         return '<%s %s - %s>' % (self.type,
                                  [rs.type for rs in self.subject_relations()],
@@ -214,34 +286,66 @@ class EntitySchema(PermissionMixIn, ERSchema):
     def _rehash(self):
         self.subjrels = rehash(self.subjrels)
         self.objrels = rehash(self.objrels)
+        self._clear_rdef_index()
+
+    def _clear_rdef_index(self):
+        self.__dict__.pop('_rdef_index', None)
+
+    def _freeze(self):
+        self._frozen_subjrels = tuple(self.subjrels.values())
+        self._frozen_objrels = tuple(self.objrels.values())
+        self._frozen_rdefs = {'subject': self._role_rdefs('subject'),
+                              'object': self._role_rdefs('object')}
+
+    def _unfreeze(self):
+        for attr in ('_frozen_subjrels', '_frozen_objrels', '_frozen_rdefs'):
+            self.__dict__.pop(attr, None)
 
     def advertise_new_add_permission(self):
         pass
 
+    def _role_relations(self, role):
+        """return the subject or object relations dictionary according to
+        `role`, without adding pending relation definitions if any
+        """
+        pending = self.__dict__.get('_pending_rels')
+        if pending is not None:
+            return pending[role == 'object']
+        if role == 'subject':
+            return self.subjrels
+        return self.objrels
 
     # schema building methods #################################################
 
     def add_subject_relation(self, rschema):
         """register the relation schema as possible subject relation"""
-        self.subjrels[rschema] = rschema
+        self._changed()
+        self._role_relations('subject')[rschema] = rschema
         clear_cache(self, 'ordered_relations')
         clear_cache(self, 'meta_attributes')
+        self._clear_rdef_index()
 
     def add_object_relation(self, rschema):
         """register the relation schema as possible object relation"""
-        self.objrels[rschema] = rschema
+        self._changed()
+        self._role_relations('object')[rschema] = rschema
+        self._clear_rdef_index()
 
     def del_subject_relation(self, rtype):
+        self._changed()
+        self._clear_rdef_index()
         try:
-            del self.subjrels[rtype]
+            del self._role_relations('subject')[rtype]
             clear_cache(self, 'ordered_relations')
             clear_cache(self, 'meta_attributes')
         except KeyError:
             pass
 
     def del_object_relation(self, rtype):
+        self._changed()
+        self._clear_rdef_index()
         try:
-            del self.objrels[rtype]
+            del self._role_relations('object')[rtype]
         except KeyError:
             pass
 
@@ -255,20 +359,13 @@ class EntitySchema(PermissionMixIn, ERSchema):
         return None
 
     def ancestors(self):
-        specializes = self.specializes()
-        ancestors = []
-        while specializes:
-            ancestors.append(specializes)
-            specializes = specializes.specializes()
-        return ancestors
+        return list(self.schema._specialization_closure()[self][0])
 
     def specialized_by(self, recursive=True):
-        eschema = self.schema.eschema
-        subschemas = [eschema(etype) for etype in self._specialized_by]
         if recursive:
-            for subschema in subschemas[:]:
-                subschemas.extend(subschema.specialized_by(recursive=True))
-        return subschemas
+            return list(self.schema._specialization_closure()[self][1])
+        eschema = self.schema.eschema
+        return [eschema(etype) for etype in self._specialized_by]
 
     def has_relation(self, rtype, role):
         if role == 'subject':
@@ -277,16 +374,37 @@ class EntitySchema(PermissionMixIn, ERSchema):
 
     def subject_relations(self):
         """return a list of relations that may have this type of entity as
-        subject
+        subject (a tuple if the schema is frozen)
         """
+        if self._frozen_subjrels is not None:
+            return self._frozen_subjrels
         return list(self.subjrels.values())
 
     def object_relations(self):
         """return a list of relations that may have this type of entity as
-        object
+        object (a tuple if the schema is frozen)
         """
+        if self._frozen_objrels is not None:
+            return self._frozen_objrels
         return list(self.objrels.values())
 
+    def role_rdefs(self, role='subject'):
+        """return a tuple of relation definitions where this type of entity is
+        the subject or object, according to `role`
+        """
+        if self._frozen_rdefs is not None:
+            return self._frozen_rdefs[role]
+        return self._role_rdefs(role)
+
+    def _role_rdefs(self, role):
+        if role == 'subject':
+            relations = self.subjrels
+        else:
+            relations = self.objrels
+        return tuple(rschema.role_rdef(self, ttype, role)
+                     for rschema in relations.values()
+                     for ttype in rschema.targets(self, role))
+
     def rdef(self, rtype, role='subject', targettype=None, takefirst=False):
         """return a relation definition schema for a relation of this entity type
 
@@ -294,19 +412,39 @@ class EntitySchema(PermissionMixIn, ERSchema):
         to different entity types (ambiguous relation), one of them is picked
         randomly. If also takefirst is False, a warning will be emitted.
         """
+        # lookups are indexed since this is called a lot by client code; the
+        # index is cleared whenever relations of this entity type change
+        try:
+            index = self._rdef_index
+        except AttributeError:
+            index = self._rdef_index = {}
+        key = (rtype, role, targettype)
+        try:
+            rdef, types = index[key]
+        except KeyError:
+            rdef, types = index[key] = self._lookup_rdef(rtype, role, targettype)
+        if types is not None and not takefirst:
+            warnings.warn('[yams 0.38] no targettype specified and there are several '
+                          'relation definitions for rtype %s: %s. Yet you get the first '
+                          'rdef.' % (rtype, [eschema.type for eschema in types]),
+                          Warning, stacklevel=2)
+        return rdef
+
+    def _lookup_rdef(self, rtype, role, targettype):
+        """return a 2-uple (relation definition, possible target types) where
+        target types is None unless it's ambiguous (see :meth:`rdef`)
+        """
         rschema = self.schema.rschema(rtype)
+        ambiguous = None
         if targettype is None:
             if role == 'subject':
                 types = rschema.objects(self)
             else:
                 types = rschema.subjects(self)
-            if len(types) != 1 and not takefirst:
-                warnings.warn('[yams 0.38] no targettype specified and there are several '
-                              'relation definitions for rtype %s: %s. Yet you get the first '
-                              'rdef.' % (rtype, [eschema.type for eschema in types]),
-                              Warning, stacklevel=2)
+            if len(types) != 1:
+                ambiguous = types
             targettype = types[0]
-        return rschema.role_rdef(self, targettype, role)
+        return rschema.role_rdef(self, targettype, role), ambiguous
 
     @cached
     def ordered_relations(self):
@@ -503,21 +641,110 @@ class EntitySchema(PermissionMixIn, ERSchema):
         if _ is not None:
             warnings.warn('[yams 0.36] _ argument is deprecated, remove it',
                           DeprecationWarning, stacklevel=2)
-        _ = text_type
-        errors = {}
-        msgargs = {}
-        i18nvalues = []
-        relations = relations or self.subject_relations()
-        for rschema in relations:
+        if relations:
+            validator = _build_validator(self._validation_plan(relations))
+        else:
+            validator = self.compile_validator()
+        validator(entity, creation)
+
+    def compile_validator(self):
+        """return a callable `validator(entity, creation=False)` behaving like
+        :meth:`check` for every attribute of this entity type.
+
+        Attribute definitions (destination type, required flag, type checker
+        and converter, constraints) are resolved once and the result is cached
+        until the schema is modified. Constraints are read from relation
+        definitions on each call, so in-place modifications of their list are
+        taken into account.
+        """
+        version = self.schema._version
+        cached = self.__dict__.get('_validator')
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        validator = _build_validator(self._validation_plan())
+        self._validator = (version, validator)
+        return validator
+
+    def check_many(self, entities, creation=False, failfast=False):
+        """check each entity of the `entities` iterable as :meth:`check` would
+        and return the list of :exc:`ValidationError` raised, in order (empty
+        if every entity is valid).
+
+        If `failfast` is true, the first validation error is raised and
+        remaining entities aren't checked.
+
+        `NOW` and `TODAY` constraint boundaries are evaluated once for all
+        entities (see :func:`yams.constraints.fixed_clock`).
+        """
+        validator = self.compile_validator()
+        errors = []
+        with fixed_clock():
+            for entity in entities:
+                try:
+                    validator(entity, creation)
+                except ValidationError as ex:
+                    if failfast:
+                        raise
+                    errors.append(ex)
+        return errors
+
+    def check_columns(self, columns, creation=False):
+        """check attribute values of several entities given column-wise, see
+        :func:`yams.columnar.check_columns` (requires numpy)
+        """
+        from yams.columnar import check_columns
+        return check_columns(self, columns, creation)
+
+    def _validation_plan(self, relations=None):
+        """return a tuple of (rschema, qualified name, required, attribute
+        schema, checker, converter, relation definition) for each attribute to
+        check
+        """
+        plan = []
+        for rschema in relations or self.subject_relations():
             if not rschema.final:
                 continue
             aschema = self.destination(rschema)
-            qname = role_name(rschema, 'subject')
             rdef = rschema.rdef(self, aschema)
             # don't care about rhs cardinality, always '*' (if it make senses)
             card = rdef.cardinality[0]
             assert card in '?1'
-            required = card == '1'
+            plan.append((rschema, role_name(rschema, 'subject'), card == '1',
+                         aschema, aschema.field_checkers[aschema],
+                         aschema.field_converters.get(aschema), rdef))
+        return tuple(plan)
+
+    def check_value(self, value):
+        """check the value of a final entity (ie a const value)"""
+        return self.field_checkers[self](self, value)
+
+    def convert_value(self, value):
+        """check the value of a final entity (ie a const value)"""
+        try:
+            return self.field_converters[self](value)
+        except KeyError:
+            return value
+
+    def vocabulary(self, rtype):
+        """backward compat return the vocabulary of a subject relation
+        """
+        cstr = self.rdef(rtype).constraint_by_interface(IVocabularyConstraint)
+        if cstr is None:
+            raise AssertionError('field %s of entity %s has no vocabulary' %
+                                 (rtype, self))
+        return cstr.vocabulary()
+
+
+def _build_validator(plan):
+    """return a function checking an entity according to the given validation
+    plan (see :meth:`EntitySchema._validation_plan`)
+    """
+    def validator(entity, creation=False):
+        errors = {}
+        msgargs = {}
+        i18nvalues = []
+        for (rschema, qname, required, aschema, checker, converter,
+             rdef) in plan:
             # check value according to their type
             try:
                 value = entity[rschema]
@@ -533,8 +760,7 @@ class EntitySchema(PermissionMixIn, ERSchema):
                 if required:
                     errors[qname] = _('required attribute')
                 continue
-            rtype = rschema.type
-            if not aschema.check_value(value):
+            if not checker(aschema, value):
                 errors[qname] = _('incorrect value (%(KEY-value)r) for type "%(KEY-type)s"')
                 msgargs[qname+'-value'] = value
                 msgargs[qname+'-type'] = aschema.type
@@ -543,11 +769,12 @@ class EntitySchema(PermissionMixIn, ERSchema):
                     errors[qname] += '; you might want to try unicode'
                 continue
             # ensure value has the correct python type
-            nvalue = aschema.convert_value(value)
-            if nvalue != value:
-                # don't change what's has not changed, who knows what's behind
-                # this <entity> thing
-                entity[rschema] = value = nvalue
+            if converter is not None:
+                nvalue = converter(value)
+                if nvalue != value:
+                    # don't change what's has not changed, who knows what's
+                    # behind this <entity> thing
+                    entity[rschema] = value = nvalue
             # check arbitrary constraints
             for constraint in rdef.constraints:
                 if not constraint.check(entity, rschema, value):
@@ -557,26 +784,7 @@ class EntitySchema(PermissionMixIn, ERSchema):
                     break
         if errors:
             raise ValidationError(entity, errors, msgargs, i18nvalues)
-
-    def check_value(self, value):
-        """check the value of a final entity (ie a const value)"""
-        return self.field_checkers[self](self, value)
-
-    def convert_value(self, value):
-        """check the value of a final entity (ie a const value)"""
-        try:
-            return self.field_converters[self](value)
-        except KeyError:
-            return value
-
-    def vocabulary(self, rtype):
-        """backward compat return the vocabulary of a subject relation
-        """
-        cstr = self.rdef(rtype).constraint_by_interface(IVocabularyConstraint)
-        if cstr is None:
-            raise AssertionError('field %s of entity %s has no vocabulary' %
-                                 (rtype, self))
-        return cstr.vocabulary()
+    return validator
 
 
 class RelationDefinitionSchema(PermissionMixIn):
@@ -601,6 +809,30 @@ class RelationDefinitionSchema(PermissionMixIn):
     BASE_TYPE_PROPERTIES = {'String': {'fulltextindexed': False,
                                        'internationalizable': False},
                             'Bytes': {'fulltextindexed': False}}
+    # there are lots of relation definitions in large schemas, so keep them
+    # compact: properties known here are stored in slots, others (e.g.
+    # parameters of base types registered later, or attributes set by client
+    # code) in the `_extra` dictionary
+    _SLOTS = frozenset(chain(('subject', 'rtype', 'object', 'package'),
+                             _RPROPERTIES, _NONFINAL_RPROPERTIES,
+                             _FINAL_RPROPERTIES,
+                             *BASE_TYPE_PROPERTIES.values()))
+    __slots__ = ('_extra',) + tuple(sorted(_SLOTS))
+
+    # incremented when properties of base types change, see
+    # `yams.register_base_type`
+    _properties_version = 0
+
+    @classmethod
+    def _properties_key(cls):
+        """return a key changing along with the set of properties, for caching
+        computations depending on it
+        """
+        # also consider properties dictionaries size since client code may
+        # add properties directly into them
+        return (cls._properties_version, len(cls._RPROPERTIES),
+                len(cls._NONFINAL_RPROPERTIES), len(cls._FINAL_RPROPERTIES),
+                len(cls.BASE_TYPE_PROPERTIES))
 
     @classmethod
     def ALL_PROPERTIES(cls):
@@ -610,6 +842,7 @@ class RelationDefinitionSchema(PermissionMixIn):
                          *cls.BASE_TYPE_PROPERTIES.values()))
 
     def __init__(self, subject, rtype, object, package, values=None):
+        object_setattr(self, '_extra', None)
         if values is not None:
             self.update(values)
         self.subject = subject
@@ -624,9 +857,71 @@ class RelationDefinitionSchema(PermissionMixIn):
         else:
             return ('read', 'add', 'delete')
 
+    def __setattr__(self, attr, value):
+        # other attributes are set by client code, e.g. an eid, and don't
+        # modify the schema
+        if attr in self._SLOTS:
+            self._changed()
+        self._set(attr, value)
+
+    def __getattr__(self, attr):
+        # only called for attributes which are not in slots
+        if attr != '_extra' and self._extra and attr in self._extra:
+            return self._extra[attr]
+        raise AttributeError(attr)
+
+    def _set(self, attr, value):
+        if attr in self._SLOTS:
+            object_setattr(self, attr, value)
+        elif self._extra is None:
+            object_setattr(self, '_extra', {attr: value})
+        else:
+            self._extra[attr] = value
+
+    def _changed(self):
+        """to be called before any modification, see :meth:`Schema._changed`"""
+        schema = getattr(getattr(self, 'rtype', None), 'schema', None)
+        if schema is not None:
+            schema._changed()
+
+    def __getstate__(self):
+        """return a dictionary of the relation definition's attributes"""
+        state = dict(self._extra or ())
+        for attr, member in _RDEF_MEMBERS:
+            try:
+                state[attr] = member.__get__(self)
+            except AttributeError: # unset slot
+                continue
+        return state
+
+    def __setstate__(self, state):
+        try:
+            self._extra
+        except AttributeError: # unset slot
+            object_setattr(self, '_extra', None)
+        for attr, value in state.items():
+            self._set(attr, value)
+
+    def __reduce__(self):
+        rschema = getattr(self, 'rtype', None)
+        schema = getattr(rschema, 'schema', None)
+        if (schema is not None and schema._relations.get(rschema.type) is rschema
+                and rschema.rdefs.get((self.subject, self.object)) is self):
+            # looked up in the relation schema, restored along with its schema
+            # (see `Schema.__reduce__`)
+            return (_rdef_lookup, (rschema, self.subject, self.object))
+        return (copyreg.__newobj__, (self.__class__,), self.__getstate__())
+
+    def __copy__(self):
+        clone = self.__class__.__new__(self.__class__)
+        clone.__setstate__(self.__getstate__())
+        return clone
+
     def update(self, values):
         # XXX check we're copying existent properties
-        self.__dict__.update(values)
+        self._changed()
+        for attr, value in values.items():
+            self._set(attr, value)
 
     def __str__(self):
         if self.object.final:
@@ -654,7 +949,8 @@ class RelationDefinitionSchema(PermissionMixIn):
                 defaultaddperms = DEFAULT_ATTRPERMS['add']
             else:
                 defaultaddperms = self.permissions['update']
-            self.permissions['add'] = defaultaddperms
+            # copy on write, see `set_action_permissions`
+            self.permissions = dict(self.permissions, add=defaultaddperms)
             warnings.warn('[yams 0.39] %s: new "add" permissions on attribute '
                           'set to %s by default, but you must make it explicit' %
                           (self, defaultaddperms), DeprecationWarning)
@@ -688,9 +984,19 @@ class RelationDefinitionSchema(PermissionMixIn):
         return self.rtype.final
 
     def dump(self, subject, object):
-        return self.__class__(subject, self.rtype, object,
-                                        self.package,
-                                        self.__dict__)
+        """return a copy of this relation definition between `subject` and
+        `object`. Property values are shared, not copied.
+        """
+        rdef = self.__class__.__new__(self.__class__)
+        object_setattr(rdef, '_extra', self._extra and self._extra.copy())
+        for attr, member in _RDEF_MEMBERS:
+            try:
+                member.__set__(rdef, member.__get__(self))
+            except AttributeError: # unset slot
+                continue
+        object_setattr(rdef, 'subject', subject)
+        object_setattr(rdef, 'object', object)
+        return rdef
 
     def role_cardinality(self, role):
         return self.cardinality[role == 'object']
@@ -723,6 +1029,11 @@ class RelationDefinitionSchema(PermissionMixIn):
 
 
 
+# slot descriptors of relation definition attributes
+_RDEF_MEMBERS = tuple((attr, RelationDefinitionSchema.__dict__[attr])
+                      for attr in sorted(RelationDefinitionSchema._SLOTS))
+
+
 class RelationSchema(ERSchema):
     """A relation is a named and oriented link between two entities.
     A relation schema defines the possible types of both extremities.
@@ -745,6 +1056,12 @@ class RelationSchema(ERSchema):
     permissions = None # only when rule is not None, for later propagation to
                        # computed relation definitions
     rdef_class = RelationDefinitionSchema
+    # precomputed navigation results, only set on frozen schemas
+    _frozen_subjects = None
+    _frozen_objects = None
+    _frozen_rdefs = None
+    _cache_attrs = ('_frozen_subjects', '_frozen_objects', '_frozen_rdefs')
+    _registry = '_relations'
 
     def __init__(self, schema=None, rdef=None, **kwargs):
         if rdef is not None:
@@ -785,6 +1102,15 @@ class RelationSchema(ERSchema):
         self.rule = rdef.rule
         self.permissions = permissions
 
+    def __getattr__(self, attr):
+        # relation definitions of a lazily built schema are only added on first
+        # access, see `Schema.defer_relation_definitions`
+        if (attr in ('rdefs', '_subj_schemas', '_obj_schemas')
+                and '_pending_rdefs' in self.__dict__):
+            self.schema._materialize_relation(self)
+            return self.__dict__[attr]
+        raise AttributeError(attr)
+
     def __repr__(self):
         return '<%s [%s]>' % (self.type,
                               '; '.join('%s,%s' % (s.type, o.type)
@@ -795,26 +1121,149 @@ class RelationSchema(ERSchema):
         self._obj_schemas = rehash(self._obj_schemas)
         self.rdefs = rehash(self.rdefs)
 
+    def _freeze(self):
+        self._frozen_subjects = dict((etype, tuple(subjtypes))
+                                     for etype, subjtypes in self._obj_schemas.items())
+        self._frozen_subjects[None] = tuple(self._subj_schemas)
+        self._frozen_objects = dict((etype, tuple(objtypes))
+                                    for etype, objtypes in self._subj_schemas.items())
+        self._frozen_objects[None] = tuple(self._obj_schemas)
+        self._frozen_rdefs = {'subject': self._rdefs_by_role('subject'),
+                              'object': self._rdefs_by_role('object')}
+        # equal constraints share one frozen instance, possibly with other
+        # schemas, hence `_unfreeze` leaves them frozen
+        for rdef in self.rdefs.values():
+            if rdef.constraints:
+                # a new tuple: the list may be shared with the definition
+                rdef._set('constraints', tuple(
+                    _frozen_constraint(cstr)
+                    for cstr in intern_constraints(rdef.constraints)))
+
+    def _unfreeze(self):
+        for attr in ('_frozen_subjects', '_frozen_objects', '_frozen_rdefs'):
+            self.__dict__.pop(attr, None)
+
     # schema building methods #################################################
 
     def update(self, subjschema, objschema, rdef):
         """Allow this relation between the two given types schema"""
+        self._changed()
+        self._check_subject(subjschema)
+        constraints = getattr(rdef, 'constraints', None)
+        pending = self._pending_checks()
+        if pending is not None:
+            if constraints:
+                pending.append((subjschema, objschema, rdef))
+        else:
+            self._check_final_consistency(subjschema, objschema, self.objects())
+            if constraints:
+                for cstr in constraints:
+                    cstr.check_consistency(subjschema, objschema, rdef)
+        if (subjschema, objschema) in self.rdefs and self.symmetric:
+            return
+        # update our internal struct
+        self._set_final(objschema.final)
+        new = (subjschema, objschema) not in self.rdefs
+        rdefs = self.init_rproperties(subjschema, objschema, rdef)
+        self._add_rdef(rdefs, new)
+        return rdefs
+
+    def update_many(self, subjschemas, objschemas, rdef):
+        """Allow this relation between each of `subjschemas` and each of
+        `objschemas` entity types schema, with properties of `rdef`. Return the
+        list of added relation definitions.
+
+        Same as calling `update` for each pair, except that checks depending
+        on a single entity type are only done once.
+        """
+        self._changed()
+        for subjschema in subjschemas:
+            self._check_subject(subjschema)
+        pending = self._pending_checks()
+        if pending is None:
+            checked = list(self.objects())
+            for objschema in objschemas:
+                self._check_final_consistency(subjschemas[0], objschema, checked)
+                checked.append(objschema)
+        constraints = getattr(rdef, 'constraints', None)
+        rdefs = []
+        for objschema in objschemas:
+            self._set_final(objschema.final)
+            for subjschema in subjschemas:
+                if pending is not None:
+                    if constraints:
+                        pending.append((subjschema, objschema, rdef))
+                elif constraints:
+                    for cstr in constraints:
+                        cstr.check_consistency(subjschema, objschema, rdef)
+                new = (subjschema, objschema) not in self.rdefs
+                if not new and self.symmetric:
+                    continue
+                rdefschema = self.init_rproperties(subjschema, objschema, rdef)
+                self._add_rdef(rdefschema, new)
+                rdefs.append(rdefschema)
+        return rdefs
+
+    def _pending_checks(self):
+        """return the list where (subject, object, rdef) triples whose
+        consistency checks are deferred by `Schema.bulk_build` should be
+        appended, or None if checks should be done immediately
+        """
+        checks = getattr(self.schema, '_bulk_checks', None)
+        if checks is None:
+            return None
+        try:
+            return checks[self]
+        except KeyError:
+            pending = checks[self] = []
+            return pending
+
+    def check_consistency(self, rdefs=None):
+        """check final consistency of this relation, then constraints
+        consistency of `rdefs`, a list of (subject, object, rdef) triples
+        (default to all relation definitions), in a single pass.
+
+        This is what `update` checks for each added relation definition.
+
+        :raise `BadSchemaDefinition`: on the first inconsistency found
+        """
+        objects = self.objects()
+        if objects:
+            final = objects[0].final
+            for objschema in objects:
+                if objschema.final != final:
+                    self._check_final_consistency(self.subjects(objschema)[0],
+                                                  objschema, objects[:1])
+        if rdefs is None:
+            rdefs = [(subjschema, objschema, rdef) for (subjschema, objschema), rdef
+                     in self.rdefs.items()]
+        for subjschema, objschema, rdef in rdefs:
+            constraints = getattr(rdef, 'constraints', None)
+            if constraints:
+                for cstr in constraints:
+                    cstr.check_consistency(subjschema, objschema, rdef)
+
+    def _check_subject(self, subjschema):
         if subjschema.final:
             msg = 'type %s can\'t be used as subject in a relation' % subjschema
             raise BadSchemaDefinition(msg)
-        # check final consistency:
-        # * a final relation only points to final entity types
-        # * a non final relation only points to non final entity types
+
+    def _check_final_consistency(self, subjschema, objschema, objschemas):
+        """check final consistency of the relation between `subjschema` and
+        `objschema` given it also points to `objschemas`:
+
+        * a final relation only points to final entity types
+        * a non final relation only points to non final entity types
+        """
         final = objschema.final
-        for eschema in self.objects():
+        for eschema in objschemas:
             if eschema is objschema:
                 continue
             if final != eschema.final:
                 if final:
-                    feschema, nfeschema = subjschema, self.subjects()[0]
-                    frschema, nfrschema = objschema, eschema
+                    feschema, frschema, nfrschema = subjschema, objschema, eschema
                 else:
-                    feschema, nfeschema = self.subjects()[0], subjschema
+                    feschema = self.subjects()[0] if self._subj_schemas else subjschema
                     frschema, nfrschema = eschema, objschema
                 msg = ("ambiguous relation: '%(feschema)s.%(rtype)s' is final (%(frschema)s) "
                        "but not '%(nfeschema)s.%(rtype)s' (%(nfrschema)s)")
@@ -822,28 +1271,26 @@ class RelationSchema(ERSchema):
                         'feschema': feschema, 'frschema': frschema,
                         'nfeschema': subjschema, 'nfrschema': nfrschema}
                 raise BadSchemaDefinition(msg)
-        constraints = getattr(rdef, 'constraints', None)
-        if constraints:
-            for cstr in constraints:
-                cstr.check_consistency(subjschema, objschema, rdef)
-        if (subjschema, objschema) in self.rdefs and self.symmetric:
-            return
-        # update our internal struct
+
+    def _set_final(self, final):
         if final:
             assert not self.symmetric, 'no sense on final relation'
             assert not self.inlined, 'no sense on final relation'
             assert not self.fulltext_container, 'no sense on final relation'
         self.final = final
-        rdefs = self.init_rproperties(subjschema, objschema, rdef)
-        self._add_rdef(rdefs)
-        return rdefs
 
-    def _add_rdef(self, rdef):
+    def _add_rdef(self, rdef, new=False):
+        """register `rdef`. `new` tells no relation definition was defined
+        between its subject and object before, sparing lookups in the
+        subject/object mappings.
+        """
         # update our internal struct
+        self._changed()
         self.rdefs[(rdef.subject, rdef.object)] = rdef
-        self._update(rdef.subject, rdef.object)
+        self._update(rdef.subject, rdef.object, new)
         if self.symmetric:
-            self._update(rdef.object, rdef.subject)
+            self._update(rdef.object, rdef.subject,
+                         new and rdef.object != rdef.subject)
             if rdef.object != rdef.subject:
                 self.rdefs[(rdef.object, rdef.subject)] = rdef
         if self.inlined and rdef.cardinality[0] in '*+':
@@ -857,15 +1304,19 @@ class RelationSchema(ERSchema):
         else:
             rdef.object.add_object_relation(self)
 
-    def _update(self, subjectschema, objectschema):
+    def _update(self, subjectschema, objectschema, new=False):
         objtypes = self._subj_schemas.setdefault(subjectschema, [])
-        if not objectschema in objtypes:
+        if new or not objectschema in objtypes:
             objtypes.append(objectschema)
         subjtypes = self._obj_schemas.setdefault(objectschema, [])
-        if not subjectschema in subjtypes:
+        if new or not subjectschema in subjtypes:
             subjtypes.append(subjectschema)
 
     def del_relation_def(self, subjschema, objschema, _recursing=False):
+        self._changed()
+        # entity types may still have the relation but not this definition
+        subjschema._clear_rdef_index()
+        objschema._clear_rdef_index()
         try:
             self._subj_schemas[subjschema].remove(objschema)
             if len(self._subj_schemas[subjschema]) == 0:
@@ -905,9 +1356,8 @@ class RelationSchema(ERSchema):
         if key in self.rdefs and not self.rdefs[key].infered:
             msg = '(%s, %s) already defined for %s' % (subject, object, self)
             raise BadSchemaDefinition(msg)
-        self.rdefs[key] = rdef = self.rdef_class(subject, self, object,
-                                                 buildrdef.package)
-        for prop, default in rdef.rproperties().items():
+        values = {}
+        for prop, default in self.rdef_class.rproperty_defs(object).items():
             rdefval = getattr(buildrdef, prop, MARKER)
             if rdefval is MARKER:
                 if prop == 'permissions':
@@ -916,7 +1366,9 @@ class RelationSchema(ERSchema):
                     default = (object in BASE_TYPES) and '?1' or '**'
             else:
                 default = rdefval
-            setattr(rdef, prop, default)
+            values[prop] = default
+        self.rdefs[key] = rdef = self.rdef_class(subject, self, object,
+                                                 buildrdef.package, values)
         return rdef
 
     # IRelationSchema interface ###############################################
@@ -936,9 +1388,11 @@ class RelationSchema(ERSchema):
 
         :raise `KeyError`: if etype is not a subject entity type.
         """
-        if etype is None:
-            return tuple(self._subj_schemas)
         try:
+            if self._frozen_subjects is not None:
+                return self._frozen_subjects[etype]
+            if etype is None:
+                return tuple(self._subj_schemas)
             return tuple(self._obj_schemas[etype])
         except KeyError:
             raise KeyError("%s does not have %s as object" % (self, etype))
@@ -951,9 +1405,11 @@ class RelationSchema(ERSchema):
 
         :raise `KeyError`: if etype is not an object entity type.
         """
-        if etype is None:
-            return tuple(self._obj_schemas)
         try:
+            if self._frozen_objects is not None:
+                return self._frozen_objects[etype]
+            if etype is None:
+                return tuple(self._obj_schemas)
             return tuple(self._subj_schemas[etype])
         except KeyError:
             raise KeyError("%s does not have %s as subject" % (self, etype))
@@ -976,6 +1432,23 @@ class RelationSchema(ERSchema):
             return self.rdefs[(etype, ttype)]
         return self.rdefs[(ttype, etype)]
 
+    def rdefs_by_role(self, role='subject'):
+        """return a dictionary mapping entity types to the tuple of relation
+        definitions where they are the subject or object, according to `role`.
+
+        The returned dictionary must not be modified.
+        """
+        if self._frozen_rdefs is not None:
+            return self._frozen_rdefs[role]
+        return self._rdefs_by_role(role)
+
+    def _rdefs_by_role(self, role):
+        index = role == 'object'
+        result = {}
+        for key, rdef in self.rdefs.items():
+            result.setdefault(key[index], []).append(rdef)
+        return dict((etype, tuple(rdefs)) for etype, rdefs in result.items())
+
     def check_permission_definitions(self):
         """check permissions are correctly defined"""
         for rdef in self.rdefs.values():
@@ -1003,6 +1476,29 @@ class Schema(object):
     relation_class = RelationSchema
     # relation that should not be infered according to entity type inheritance
     no_specialization_inference = ()
+    # incremented on each modification of the schema, used to invalidate
+    # computation results cached on schema objects
+    _version = 0
+    # frozen schema can't be modified anymore, see `freeze`
+    frozen = False
+    _frozen_entities = None
+    _frozen_relations = None
+    # transitive closure of entity types specialization, see
+    # `_specialization_closure`
+    _specialization_index = None
+    # non final entity types, see `_nonfinal_etypes`
+    _nonfinal_etypes_cache = None
+    # true once relation definitions infered from specialization have been
+    # added, see `infer_specialization_rules`
+    _infered = False
+    # true while relation definitions are deferred, and names of the relation
+    # types of pending relation definitions by involved entity type, see
+    # `defer_relation_definitions`
+    _deferring = False
+    _pending_etypes = None
+    # relation schemas and their relation definitions whose consistency checks
+    # are deferred, see `bulk_build`
+    _bulk_checks = None
 
     def __init__(self, name, construction_mode='strict'):
         super(Schema, self).__init__()
@@ -1013,16 +1509,77 @@ class Schema(object):
         self._entities = {}
         self._relations = {}
 
+    def __reduce__(self):
+        # pickle a snapshot where schema objects are referenced by type names
+        # so that dictionaries are built at once when unpickling, with correct
+        # hash values. Entity and relation schemas are restored in place from
+        # it, so those pickled along with the schema are its own ones
+        from yams.snapshot import snapshot
+        return (copyreg.__newobj__, (self.__class__,),
+                snapshot(self, serialize_constraints=False, objects=True))
+
     def __setstate__(self, state):
-        self.__dict__.update(state)
-        self._rehash()
+        if 'objects' in state:
+            from yams.snapshot import restore
+            restore(state, schema=self)
+        else:
+            # unpickling of schemas pickled by older versions
+            self.__dict__.update(state)
+            self._rehash()
 
     def _rehash(self):
         """rehash schema's internal structures"""
+        self.materialize()
+        self._etypes_changed()
+        frozen = self.frozen
+        if frozen:
+            self._unfreeze()
         for eschema in self._entities.values():
             eschema._rehash()
         for rschema in self._relations.values():
             rschema._rehash()
+        self._changed()
+        if frozen:
+            self.freeze()
+
+    def _changed(self):
+        """to be called before any modification of the schema: mark the schema
+        as modified, invalidating cached computation results.
+
+        :raise `FrozenSchemaError`: if the schema is frozen
+        """
+        if self.frozen:
+            raise FrozenSchemaError(self.name)
+        self._version += 1
+
+    def freeze(self):
+        """turn the schema into a read-only schema, and return it.
+
+        Any attempt to modify a frozen schema will raise `FrozenSchemaError`.
+        Constraints of its relation definitions are replaced by frozen copies
+        (see `yams.constraints.BaseConstraint.freeze`), equal ones being shared
+        (see `yams.constraints.intern_constraint`).
+        Navigation methods of the schema and of its entity and relation schemas
+        then return precomputed tuples instead of building new lists, hence a
+        frozen schema may be safely shared between threads.
+        """
+        self.materialize()
+        for eschema in self._entities.values():
+            eschema._freeze()
+        for rschema in self._relations.values():
+            rschema._freeze()
+        self._frozen_entities = tuple(self._entities.values())
+        self._frozen_relations = tuple(self._relations.values())
+        self.frozen = True
+        return self
+
+    def _unfreeze(self):
+        self.frozen = False
+        for eschema in self._entities.values():
+            eschema._unfreeze()
+        for rschema in self._relations.values():
+            rschema._unfreeze()
+        self._frozen_entities = self._frozen_relations = None
 
     def get(self, name, default=None):
         try:
@@ -1059,16 +1616,38 @@ class Schema(object):
         if etype in self._entities:
             msg = "entity type %s is already defined" % etype
             raise BadSchemaDefinition(msg)
+        self._changed()
         eschema = self.entity_class(self, edef)
         self._entities[etype] = eschema
+        parent = self._entities.get(eschema._specialized_type)
+        if parent is not None and etype not in parent._specialized_by:
+            # the parent's list may be shared with its definition
+            parent._specialized_by = parent._specialized_by + [etype]
+        self._etypes_changed()
+        if self._infered and eschema.specializes():
+            # infer relation definitions of its parents for the new type
+            etypes = set([eschema] + eschema.specialized_by())
+            for parent in eschema.ancestors():
+                for rschema in chain(parent.subjrels, parent.objrels):
+                    self._infer_relation_defs(rschema, subjects=etypes)
+                    self._infer_relation_defs(rschema, objects=etypes)
         return eschema
 
     def rename_entity_type(self, oldname, newname):
         """renames an entity type and update internal structures accordingly
         """
+        self._changed()
         eschema = self._entities.pop(oldname)
         eschema.type = newname
         self._entities[newname] = eschema
+        # specialization is stored using type names
+        parent = eschema.specializes()
+        if parent is not None:
+            parent._specialized_by = [newname if etype == oldname else etype
+                                      for etype in parent._specialized_by]
+        for child in eschema.specialized_by(recursive=False):
+            child._specialized_type = newname
+        self._etypes_changed()
         # rebuild internal structures since eschema's hash value has changed
         self._rehash()
 
@@ -1077,6 +1656,7 @@ class Schema(object):
         if rtype in self._relations:
             msg = "relation type %s is already defined" % rtype
             raise BadSchemaDefinition(msg)
+        self._changed()
         rschema = self.relation_class(self, rtypedef)
         self._relations[rtype] = rschema
         return rschema
@@ -1089,6 +1669,9 @@ class Schema(object):
         :return: the newly created or simply completed relation schema
         """
         rtype = rdef.name
+        if self._deferring and self._defer_relation_defs(
+                rdef, (rdef.subject,), (rdef.object,)):
+            return None
         try:
             rschema = self.rschema(rtype)
         except KeyError:
@@ -1104,7 +1687,196 @@ class Schema(object):
         except KeyError:
             return self._building_error("using unknown type %r in relation %s",
                                         rdef.object, rtype)
-        return rschema.update(subjectschema, objectschema, rdef)
+        rdefschema = rschema.update(subjectschema, objectschema, rdef)
+        if self._infered and rdefschema is not None:
+            self._infer_relation_defs(
+                rschema, [subjectschema] + subjectschema.specialized_by(),
+                [objectschema] + objectschema.specialized_by())
+        return rdefschema
+
+    def defer_relation_definitions(self, defer=True):
+        """start deferring relation definitions given to `add_relation_def`,
+        or stop if `defer` is false.
+
+        Deferred relation definitions are only registered. They are added to
+        the schema when their relation schema or an entity schema they involve
+        (or one of its parents) is navigated for the first time, e.g. when
+        accessing its relations or relation definitions. `entities`,
+        `relations` and `materialize` add all of them at once.
+
+        This lets tools using a few entity types only avoid the cost of building
+        the whole schema. Notice errors in deferred relation definitions are
+        only raised once they are added, and so are permission definitions and
+        unique together consistency checks of relation and entity schemas.
+        """
+        if defer:
+            if self._pending_etypes is None:
+                self._pending_etypes = {}
+        elif self._deferring:
+            # entity types involved in pending relation definitions, directly
+            # or through a parent, get their relations on first access
+            pending = self._pending_etypes
+            for eschema in self._entities.values():
+                if '_pending_rels' in eschema.__dict__:
+                    continue
+                if any(etype.type in pending
+                       for etype in [eschema] + eschema.ancestors()):
+                    eschema._pending_rels = (eschema.__dict__.pop('subjrels'),
+                                             eschema.__dict__.pop('objrels'))
+        self._deferring = defer
+
+    @contextmanager
+    def bulk_build(self):
+        """context manager deferring consistency checks of relation
+        definitions added in its block (final / non final objects of each
+        relation type, constraints consistency) until its exit, where they are
+        done in a single pass per relation type instead of once per added
+        relation definition.
+
+        The same `BadSchemaDefinition` errors as without bulk build are raised,
+        though only on exit: the schema should then be considered as unusable.
+        Nothing is checked if the block raises an exception. Nested blocks are
+        checked on exit of the outermost one.
+        """
+        if self._bulk_checks is not None:
+            yield
+            return
+        self._bulk_checks = checks = {}
+        try:
+            yield
+        finally:
+            del self._bulk_checks
+        for rschema, rdefs in checks.items():
+            # skip relation types removed in the block
+            if self._relations.get(rschema.type) is rschema:
+                rschema.check_consistency(rdefs)
+
+    def _defer_relation_defs(self, rdef, subjtypes, objtypes):
+        """register relation definitions between `subjtypes` and `objtypes`
+        with properties of `rdef` as pending and return True, unless the
+        relation type is unknown or already has relation definitions
+        """
+        rschema = self._relations.get(rdef.name)
+        if rschema is None:
+            return False
+        pending = rschema.__dict__.get('_pending_rdefs')
+        if pending is None:
+            if rschema.rdefs:
+                return False
+            for attr in ('rdefs', '_subj_schemas', '_obj_schemas'):
+                del rschema.__dict__[attr]
+            rschema.final = bool(objtypes) and objtypes[0] in BASE_TYPES
+            rschema._pending_rdefs = pending = []
+        pending.append((rdef, subjtypes, objtypes))
+        for etype in chain(subjtypes, objtypes):
+            self._pending_etypes.setdefault(etype, {})[rdef.name] = None
+        return True
+
+    def _materialize_relation(self, rschema):
+        """add pending relation definitions of `rschema`"""
+        rdefs = rschema.__dict__.pop('_pending_rdefs')
+        rschema.rdefs = {}
+        rschema._subj_schemas = {}
+        rschema._obj_schemas = {}
+        deferring, self._deferring = self._deferring, False
+        try:
+            for rdef, subjtypes, objtypes in rdefs:
+                self.add_relation_defs(rdef, subjtypes, objtypes)
+        finally:
+            self._deferring = deferring
+        rschema.check_permission_definitions()
+
+    def _materialize_entity(self, eschema):
+        """add pending relation definitions involving `eschema` or one of its
+        parents
+        """
+        eschema.subjrels, eschema.objrels = eschema.__dict__.pop('_pending_rels')
+        pending = self._pending_etypes
+        for etype in [eschema] + eschema.ancestors():
+            for rtype in list(pending.get(etype.type, ())):
+                rschema = self._relations.get(rtype)
+                if rschema is not None and '_pending_rdefs' in rschema.__dict__:
+                    self._materialize_relation(rschema)
+        pending.pop(eschema.type, None)
+        eschema.check_unique_together()
+
+    def materialize(self):
+        """add all relation definitions deferred by
+        `defer_relation_definitions`
+        """
+        if self._pending_etypes is None:
+            return
+        for rschema in list(self._relations.values()):
+            if '_pending_rdefs' in rschema.__dict__:
+                self._materialize_relation(rschema)
+        for eschema in list(self._entities.values()):
+            if '_pending_rels' in eschema.__dict__:
+                self._materialize_entity(eschema)
+        if not self._deferring:
+            self._pending_etypes = None
+
+    def add_relation_defs(self, rdef, subjtypes, objtypes):
+        """add relations of the same type with properties of `rdef` between
+        each entity type of `subjtypes` and each entity type of `objtypes`
+        (subject and object of `rdef` are ignored), e.g. to expand wildcards.
+
+        This is the same as calling `add_relation_def` for each pair, except
+        that the relation type, entity types and checks which don't depend on
+        both entity types are handled once.
+
+        :rtype: list
+        :return: the newly created relation definition schemas
+        """
+        if (get_unbound_function(type(self).add_relation_def)
+                is not get_unbound_function(Schema.add_relation_def)):
+            # let subclasses process each relation definition
+            rdefschemas = []
+            for subjtype in subjtypes:
+                for objtype in objtypes:
+                    pairrdef = copy(rdef)
+                    pairrdef.subject = subjtype
+                    pairrdef.object = objtype
+                    rdefschema = self.add_relation_def(pairrdef)
+                    if rdefschema is not None:
+                        rdefschemas.append(rdefschema)
+            return rdefschemas
+        subjtypes, objtypes = tuple(subjtypes), tuple(objtypes)
+        if self._deferring and self._defer_relation_defs(rdef, subjtypes,
+                                                         objtypes):
+            return []
+        rtype = rdef.name
+        try:
+            rschema = self.rschema(rtype)
+        except KeyError:
+            self._building_error('using unknown relation type in %s', rdef)
+            return []
+        subjschemas = self._building_eschemas(subjtypes, rtype)
+        objschemas = self._building_eschemas(objtypes, rtype)
+        if not (subjschemas and objschemas):
+            return []
+        rdefschemas = rschema.update_many(subjschemas, objschemas, rdef)
+        if self._infered and rdefschemas:
+            subjects = set(subjschemas)
+            for subjschema in subjschemas:
+                subjects.update(subjschema.specialized_by())
+            objects = set(objschemas)
+            for objschema in objschemas:
+                objects.update(objschema.specialized_by())
+            self._infer_relation_defs(rschema, subjects, objects)
+        return rdefschemas
+
+    def _building_eschemas(self, etypes, rtype):
+        """return entity schemas of `etypes`, handling unknown types according
+        to the construction mode
+        """
+        eschemas = []
+        for etype in etypes:
+            try:
+                eschemas.append(self.eschema(etype))
+            except KeyError:
+                self._building_error('using unknown type %r in relation %s',
+                                     etype, rtype)
+        return eschemas
 
     def _building_error(self, msg, *args):
         if self.construction_mode == 'strict':
@@ -1115,54 +1887,163 @@ class Schema(object):
         subjschema = self.eschema(subjtype)
         objschema = self.eschema(objtype)
         rschema = self.rschema(rtype)
+        rdef = rschema.rdefs.get((subjschema, objschema))
+        self._del_relation_def(subjschema, rschema, objschema)
+        if self._infered and rdef is not None and not rdef.infered:
+            # relation definitions infered from the deleted one may now be
+            # infered from another one, or not at all
+            subjects = [subjschema] + subjschema.specialized_by()
+            objects = [objschema] + objschema.specialized_by()
+            for (subject, object), irdef in list(rschema.rdefs.items()):
+                if irdef.infered and subject in subjects and object in objects:
+                    self._del_relation_def(subject, rschema, object)
+            if rschema.type in self._relations:
+                self._infer_relation_defs(rschema, subjects, objects)
+
+    def _del_relation_def(self, subjschema, rschema, objschema):
         if rschema.del_relation_def(subjschema, objschema):
-            del self._relations[rtype]
+            del self._relations[rschema.type]
+
+    def remove_unused_relation_types(self):
+        """remove relation types without relation definitions, pending ones
+        included
+        """
+        for rschema in list(self._relations.values()):
+            if '_pending_rdefs' not in rschema.__dict__ and not rschema.rdefs:
+                self.del_relation_type(rschema)
 
     def del_relation_type(self, rtype):
+        self._changed()
         # XXX don't iter directly on the dictionary since it may be changed
         # by del_relation_def
-        for subjtype, objtype in list(self.rschema(rtype).rdefs):
-            self.del_relation_def(subjtype, rtype, objtype)
+        rschema = self.rschema(rtype)
+        for subjschema, objschema in list(rschema.rdefs):
+            self._del_relation_def(subjschema, rschema, objschema)
         if not self.rschema(rtype).rdefs:
             del self._relations[rtype]
 
     def del_entity_type(self, etype):
+        self._changed()
         eschema = self._entities[etype]
         for rschema in list(eschema.subjrels.values()):
-            for objtype in rschema.objects(etype):
-                self.del_relation_def(eschema, rschema, objtype)
+            for objschema in rschema.objects(etype):
+                self._del_relation_def(eschema, rschema, objschema)
         for rschema in list(eschema.objrels.values()):
-            for subjtype in rschema.subjects(etype):
-                self.del_relation_def(subjtype, rschema, eschema)
+            for subjschema in rschema.subjects(etype):
+                self._del_relation_def(subjschema, rschema, eschema)
         if eschema.specializes():
             eschema.specializes()._specialized_by.remove(eschema)
+            self._etypes_changed()
         if eschema.specialized_by():
             raise Exception("can't remove entity type %s used as parent class by %s" %
                             (eschema, ','.join(str(et) for et in eschema.specialized_by())))
         del self._entities[etype]
+        self._etypes_changed()
         if eschema.final:
             yams.unregister_base_type(etype)
 
+    def _etypes_changed(self):
+        """to be called when entity types are added, deleted or renamed:
+        invalidate computation results depending on the set of entity types
+        """
+        self._specialization_index = None
+        self._nonfinal_etypes_cache = None
+
+    def _nonfinal_etypes(self):
+        """return the tuple of non final entity types, computed once until an
+        entity type is added, deleted or renamed
+        """
+        etypes = self._nonfinal_etypes_cache
+        if etypes is None:
+            etypes = self._nonfinal_etypes_cache = tuple(
+                etype for etype, eschema in self._entities.items()
+                if not eschema.final)
+        return etypes
+
+    def _specialization_closure(self):
+        """return a dictionary mapping each entity schema to a 3-uple
+        (ancestors, descendants, ancestors set), computed once until an entity
+        type is added, deleted or renamed.
+
+        Ancestors are ordered from the parent to the root of the hierarchy,
+        descendants by depth.
+        """
+        index = self._specialization_index
+        if index is None:
+            index = {}
+            def descendants(eschema):
+                try:
+                    return index[eschema][1]
+                except KeyError:
+                    pass
+                children = [self.eschema(etype) for etype in eschema._specialized_by]
+                result = list(children)
+                for child in children:
+                    result += descendants(child)
+                ancestors = []
+                parent = eschema.specializes()
+                while parent is not None:
+                    ancestors.append(parent)
+                    parent = parent.specializes()
+                index[eschema] = (tuple(ancestors), tuple(result),
+                                  frozenset(ancestors))
+                return index[eschema][1]
+            for eschema in self._entities.values():
+                descendants(eschema)
+            self._specialization_index = index
+        return index
+
+    def is_subtype(self, etype, parent):
+        """return True if entity type `etype` is `parent` or specializes it,
+        directly or not
+        """
+        return etype == parent or parent in self._specialization_closure()[etype][2]
+
     def infer_specialization_rules(self):
-        for rschema in self.relations():
-            if rschema in self.no_specialization_inference:
-                continue
-            for (subject, object), rdef in list(rschema.rdefs.items()):
-                subjeschemas = [subject] + subject.specialized_by(recursive=True)
-                objeschemas = [object] + object.specialized_by(recursive=True)
-                for subjschema in subjeschemas:
-                    for objschema in objeschemas:
-                        # don't try to add an already defined relation
-                        if (subjschema, objschema) in rschema.rdefs:
-                            continue
-                        thisrdef = rdef.dump(subjschema, objschema)
-                        thisrdef.infered = True
-                        rschema._add_rdef(thisrdef)
+        """add relation definitions infered from entity types specialization.
+
+        Once done, infered relation definitions are maintained incrementally
+        when relation definitions or specialized entity types are added to
+        or deleted from the schema, until `remove_infered_definitions` is
+        called. Pending relation definitions (see `defer_relation_definitions`)
+        are processed once added.
+        """
+        for rschema in list(self._relations.values()):
+            if '_pending_rdefs' not in rschema.__dict__:
+                self._infer_relation_defs(rschema)
+        self._infered = True
+
+    def _infer_relation_defs(self, rschema, subjects=None, objects=None):
+        """add relation definitions of `rschema` infered from entity types
+        specialization, restricted to subjects in `subjects` and objects in
+        `objects` if specified
+        """
+        if rschema in self.no_specialization_inference:
+            return
+        closure = self._specialization_closure()
+        for (subject, object), rdef in list(rschema.rdefs.items()):
+            subjeschemas = (subject,) + closure[subject][1]
+            if subjects is not None:
+                subjeschemas = [eschema for eschema in subjeschemas
+                                if eschema in subjects]
+            objeschemas = (object,) + closure[object][1]
+            if objects is not None:
+                objeschemas = [eschema for eschema in objeschemas
+                               if eschema in objects]
+            for subjschema in subjeschemas:
+                for objschema in objeschemas:
+                    # don't try to add an already defined relation
+                    if (subjschema, objschema) in rschema.rdefs:
+                        continue
+                    thisrdef = rdef.dump(subjschema, objschema)
+                    thisrdef.infered = True
+                    rschema._add_rdef(thisrdef, new=True)
 
     def remove_infered_definitions(self):
         """remove any infered definitions added by
         `infer_specialization_rules`
         """
+        self._infered = False
         for rschema in self.relations():
             if rschema.final:
                 continue
@@ -1181,8 +2062,13 @@ class Schema(object):
         """return a list of possible entity's type
 
         :rtype: list
-        :return: defined entity's types (str) or schemas (`EntitySchema`)
+        :return: defined entity's types (str) or schemas (`EntitySchema`), as
+          a tuple if the schema is frozen
         """
+        if self._frozen_entities is not None:
+            return self._frozen_entities
+        if self._pending_etypes is not None and not self._deferring:
+            self.materialize()
         return list(self._entities.values())
 
     def has_entity(self, etype):
@@ -1214,8 +2100,13 @@ class Schema(object):
         """return the list of possible relation'types
 
         :rtype: list
-        :return: defined relation's types (str) or schemas (`RelationSchema`)
+        :return: defined relation's types (str) or schemas (`RelationSchema`),
+          as a tuple if the schema is frozen
         """
+        if self._frozen_relations is not None:
+            return self._frozen_relations
+        if self._pending_etypes is not None and not self._deferring:
+            self.materialize()
         return list(self._relations.values())
 
     def has_relation(self, rtype):
@@ -0,0 +1,298 @@
+# copyright 2016 LOGILAB S.A. (Paris, FRANCE), all rights reserved.
+# contact http://www.logilab.fr/ -- mailto:contact@logilab.fr
+#
+# This file is part of yams.
+#
+# yams is free software: you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 2.1 of the License, or (at your option)
+# any later version.
+#
+# yams is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with yams. If not, see <http://www.gnu.org/licenses/>.
+"""Snapshots of built schemas.
+
+A snapshot holds everything needed to rebuild a schema (entity and relation
+schemas, relation definitions with all their properties) without executing
+schema definition modules nor going through the schema building process.
+
+Entity types, relation types and relation definitions are referenced by type
+names and constraints are stored using their `serialize` method, so snapshots
+don't depend on the internals of the schema classes.
+"""
+
+__docformat__ = "restructuredtext en"
+
+import gc
+from contextlib import contextmanager
+from importlib import import_module
+
+from six.moves import cPickle as pickle
+
+from yams.schema import Schema, _RDEF_MEMBERS, object_setattr
+
+# increment when the snapshot data structure changes
+SNAPSHOT_FORMAT = ('yams-snapshot', 3)
+
+
+# relation definition slot descriptors by attribute name
+_RDEF_SLOTS = dict(_RDEF_MEMBERS)
+_SUBJECT = _RDEF_SLOTS['subject']
+_RTYPE = _RDEF_SLOTS['rtype']
+_OBJECT = _RDEF_SLOTS['object']
+# relation definition slots stored in snapshots, where the subject, relation
+# type and object are given by the relation definition key
+_STATE_MEMBERS = tuple((attr, member) for attr, member in _RDEF_MEMBERS
+                       if attr not in ('subject', 'rtype', 'object'))
+
+
+def dump_snapshot(schema, path):
+    """write a snapshot of `schema` into the file at `path`"""
+    with open(path, 'wb') as stream:
+        pickle.dump((SNAPSHOT_FORMAT, snapshot(schema)), stream,
+                    pickle.HIGHEST_PROTOCOL)
+
+
+def load_snapshot(path, schemacls=Schema):
+    """return a schema of class `schemacls` rebuilt from the snapshot written
+    in the file at `path` by :func:`dump_snapshot`
+
+    :raise `ValueError`: if the file isn't a snapshot of a supported format
+    """
+    with open(path, 'rb') as stream:
+        try:
+            fmt, data = pickle.load(stream)
+        except Exception as ex:
+            raise ValueError('%s is not a schema snapshot (%s)' % (path, ex))
+    if fmt != SNAPSHOT_FORMAT:
+        raise ValueError('unsupported schema snapshot format %s in %s'
+                         % (fmt, path))
+    return restore(data, schemacls)
+
+
+def snapshot(schema, serialize_constraints=True, objects=False):
+    """return a snapshot of `schema` as a picklable data structure
+
+    Constraints are kept as is instead of being serialized if
+    `serialize_constraints` is false. Entity and relation schemas are part of
+    the snapshot if `objects` is true, and restored in place by
+    :func:`restore`.
+    """
+    # relation definitions deferred by a lazy loading are part of the snapshot
+    schema.materialize()
+    with _gc_disabled():
+        return _snapshot(schema, serialize_constraints, objects)
+
+
+def _snapshot(schema, serialize_constraints, objects):
+    state = _state(schema, ('_entities', '_relations', '_version',
+                            '_frozen_entities', '_frozen_relations',
+                            '_specialization_index', '_nonfinal_etypes_cache',
+                            '_pending_etypes'))
+    entities = []
+    for eschema in schema._entities.values():
+        estate = _state(eschema, ('schema',))
+        estate['subjrels'] = [rschema.type for rschema in eschema.subjrels]
+        estate['objrels'] = [rschema.type for rschema in eschema.objrels]
+        entities.append(estate)
+    relations = []
+    # relation definitions have a few distinct sets of slots (e.g. final and
+    # non final ones) only stored once, indexed by the tuple of unset slots
+    layouts = {}
+    for rschema in schema._relations.values():
+        rstate = _state(rschema, ('schema', 'rdefs'))
+        rstate['_subj_schemas'] = _types_mapping(rschema._subj_schemas)
+        rstate['_obj_schemas'] = _types_mapping(rschema._obj_schemas)
+        rdefs, indexes = [], {}
+        for (subjschema, objschema), rdef in rschema.rdefs.items():
+            # symmetric relation definitions are registered twice
+            if id(rdef) in indexes:
+                rdefs.append((subjschema.type, objschema.type, indexes[id(rdef)]))
+            else:
+                indexes[id(rdef)] = len(rdefs)
+                rdefs.append((subjschema.type, objschema.type)
+                             + _rdef_state(rdef, serialize_constraints, layouts))
+        relations.append((rstate, rdefs))
+    rdef_layouts = [None] * len(layouts)
+    for index, attrs in layouts.values():
+        rdef_layouts[index] = attrs
+    data = {'state': state, 'entities': entities, 'relations': relations,
+            'rdef_layouts': rdef_layouts,
+            'serialized_constraints': serialize_constraints}
+    if objects:
+        data['objects'] = (tuple(schema._entities.values()),
+                           tuple(schema._relations.values()))
+    return data
+
+
+def restore(data, schemacls=Schema, schema=None):
+    """return a schema of class `schemacls` rebuilt from `data`, as returned
+    by :func:`snapshot`, or rebuild `schema` (a new instance of that class) if
+    specified
+    """
+    with _gc_disabled():
+        return _restore(data, schemacls, schema)
+
+
+def _restore(data, schemacls, schema):
+    if schema is None:
+        schema = schemacls.__new__(schemacls)
+    schema.__dict__.update(data['state'])
+    frozen, schema.frozen = schema.frozen, False
+    schema._entities = eschemas = {}
+    schema._relations = rschemas = {}
+    eschemaobjs, rschemaobjs = data.get('objects') or ((), ())
+    for index, estate in enumerate(data['entities']):
+        if eschemaobjs:
+            eschema = eschemaobjs[index]
+            eschema.__dict__.update(estate)
+        else:
+            eschema = _new(schema.entity_class, estate)
+        eschema.schema = schema
+        eschemas[eschema.type] = eschema
+    cstrclasses = {} if data['serialized_constraints'] else None
+    # slot setters of relation definition attributes by layout, None if some
+    # of them have to be restored by `_restore_rdef`
+    setters = [None] * len(data['rdef_layouts'])
+    if cstrclasses is None:
+        for index, attrs in enumerate(data['rdef_layouts']):
+            if all(attr in _RDEF_SLOTS for attr in attrs):
+                setters[index] = tuple(_RDEF_SLOTS[attr].__set__
+                                       for attr in attrs)
+    for index, (rstate, rdefstates) in enumerate(data['relations']):
+        if rschemaobjs:
+            rschema = rschemaobjs[index]
+            rschema.__dict__.update(rstate)
+        else:
+            rschema = _new(schema.relation_class, rstate)
+        rschema.schema = schema
+        rschemas[rschema.type] = rschema
+        rschema._subj_schemas = _schemas_mapping(rschema._subj_schemas, eschemas)
+        rschema._obj_schemas = _schemas_mapping(rschema._obj_schemas, eschemas)
+        rdefcls = rschema.rdef_class
+        rschema.rdefs = rdefs = {}
+        restored = []
+        for rdefstate in rdefstates:
+            subjschema = eschemas[rdefstate[0]]
+            objschema = eschemas[rdefstate[1]]
+            if len(rdefstate) == 3:
+                rdef = rdefs[(subjschema, objschema)] = restored[rdefstate[2]]
+                restored.append(rdef)
+                continue
+            layout, extra = rdefstate[2], rdefstate[3]
+            rdef = rdefcls.__new__(rdefcls)
+            object_setattr(rdef, '_extra', dict(extra) if extra else None)
+            if setters[layout] is None:
+                _restore_rdef(rdef, data['rdef_layouts'][layout],
+                              rdefstate[4:], cstrclasses)
+            else:
+                for setter, value in zip(setters[layout], rdefstate[4:]):
+                    setter(rdef, value)
+            _SUBJECT.__set__(rdef, subjschema)
+            _RTYPE.__set__(rdef, rschema)
+            _OBJECT.__set__(rdef, objschema)
+            rdefs[(subjschema, objschema)] = rdef
+            restored.append(rdef)
+    for eschema in eschemas.values():
+        eschema.subjrels = dict((rschemas[rtype], rschemas[rtype])
+                                for rtype in eschema.subjrels)
+        eschema.objrels = dict((rschemas[rtype], rschemas[rtype])
+                               for rtype in eschema.objrels)
+    if frozen:
+        schema.freeze()
+    return schema
+
+
+@contextmanager
+def _gc_disabled():
+    """disable the garbage collector: lots of objects are created when taking
+    or restoring snapshots but none of them is garbage, collections would only
+    traverse them over and over
+    """
+    gcenabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if gcenabled:
+            gc.enable()
+
+
+def _state(obj, skip):
+    if hasattr(obj, '_cache_attrs'):
+        state = obj.__getstate__()
+    else:
+        state = obj.__dict__.copy()
+    for attr in skip:
+        state.pop(attr, None)
+    return state
+
+
+def _new(cls, state):
+    obj = cls.__new__(cls)
+    obj.__dict__.update(state)
+    return obj
+
+
+def _types_mapping(mapping):
+    return [(eschema.type, [teschema.type for teschema in teschemas])
+            for eschema, teschemas in mapping.items()]
+
+
+def _schemas_mapping(mapping, eschemas):
+    return dict((eschemas[etype], [eschemas[ttype] for ttype in ttypes])
+                for etype, ttypes in mapping)
+
+
+def _rdef_state(rdef, serialize_constraints, layouts):
+    """return the state of a relation definition as a tuple: index of the
+    names of its set slots in `layouts`, attributes which aren't slots (a
+    dictionary or None) followed by values of set slots
+    """
+    values, unset = [], []
+    for attr, member in _STATE_MEMBERS:
+        try:
+            values.append(member.__get__(rdef))
+        except AttributeError: # unset slot
+            unset.append(attr)
+    unset = tuple(unset)
+    try:
+        layout, attrs = layouts[unset]
+    except KeyError:
+        attrs = tuple(attr for attr, member in _STATE_MEMBERS
+                      if attr not in unset)
+        layout, attrs = layouts[unset] = (len(layouts), attrs)
+    if serialize_constraints and 'constraints' in attrs:
+        index = attrs.index('constraints')
+        values[index] = type(values[index])(
+            (cstr.__class__.__module__, cstr.__class__.__name__, cstr.serialize())
+            for cstr in values[index])
+    return (layout, rdef._extra or None) + tuple(values)
+
+
+def _restore_rdef(rdef, attrs, values, cstrclasses):
+    """set attributes `attrs` of `rdef` to `values`, restoring serialized
+    constraints if `cstrclasses` isn't None
+    """
+    for attr, value in zip(attrs, values):
+        if attr == 'constraints' and cstrclasses is not None:
+            value = _restore_constraints(value, cstrclasses)
+        rdef._set(attr, value)
+
+
+def _restore_constraints(serialized, cstrclasses):
+    constraints = []
+    for modname, clsname, value in serialized:
+        try:
+            cstrcls = cstrclasses[(modname, clsname)]
+        except KeyError:
+            cstrcls = getattr(import_module(modname), clsname)
+            cstrclasses[(modname, clsname)] = cstrcls
+        constraints.append(cstrcls.deserialize(value))
+    # keep the sequence type (tuple or list) of the original constraints
+    return type(serialized)(constraints)
@@ -24,8 +24,12 @@ def _error(file=None, line=None, msg=''):
     print(':'.join(('E', file, line, msg)), file=sys.stderr)
 
 def check_schema():
-    config = Configuration(
-        usage="yams-check [[[...] deps] deps] apps",
+    options = [('profile', {'default': False, 'short': 'p',
+                            'help': 'print time spent in each schema '
+                                    'building phase'}),
+              ]
+    config = Configuration(options=options,
+        usage="yams-check [--profile] [[[...] deps] deps] apps",
         doc="Check the schema of an application.",
         version=version)
     dirnames = config.load_command_line_configuration()
@@ -35,11 +39,14 @@ def check_schema():
     for dir in dirnames:
         assert exists(dir), dir
     try:
-        SchemaLoader().load(dirnames)
+        loader = SchemaLoader()
+        loader.load(dirnames, profile=config['profile'])
+        if config['profile']:
+            print(loader.profile.format())
         return 0
     except Exception as ex:
         tb_offset = getattr(ex, 'tb_offset', 0)
-        filename, lineno, func, text = extract_tb(sys.exc_traceback)[-1-tb_offset]
+        filename, lineno, func, text = extract_tb(sys.exc_info()[2])[-1-tb_offset]
         if hasattr(ex, "schema_files"):
             filename = ', '.join(ex.schema_files)
         _error(filename, lineno,"%s -> %s" % (ex.__class__.__name__, ex))